@@ -0,0 +1,83 @@
+"""文章图片地址替换的基准
+
+对比 BeautifulSoup 解析整篇文章、修改 img 后再序列化的旧方式，
+与 html.parser 事件定位 img 后按偏移量拼接替换的新方式，
+文章为 100KB 以上、含数十张图片的HTML，并校验两种方式得到的图片地址和 alt 一致。
+
+运行：python -m benchmarks.bench_html_rewrite
+"""
+import random
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from tools.common.html_rewriter import image_sources, rewrite_images
+
+NUMBER = 20
+SIZES = [100 * 1024, 400 * 1024]
+
+def build_article(size, seed=0):
+    rng = random.Random(seed)
+    words = ["即梦", "生成", "图片", "百家号", "发布", "性能", "优化", "文章", "内容", "测试"]
+    parts, length, index = [], 0, 0
+    while length < size:
+        text = "".join(rng.choice(words) for _ in range(rng.randint(40, 120)))
+        block = f'<p style="text-indent:2em">{text}<strong>{rng.choice(words)}</strong> &amp; {text[:20]}&nbsp;<br></p>\n'
+        if rng.random() < 0.15:
+            alt = ' alt="配图"' if index % 3 == 0 else ""
+            block += f'<figure><img class="content-img" src="https://p3.example.com/img/{index}.jpg?x-expires=1&amp;sig=ab"{alt} width="600"></figure>\n'
+            index += 1
+        parts.append(block)
+        length += len(block)
+    return "".join(parts)
+
+def replacement(src):
+    return "https://pic.rmb.bdstatic.com/" + src.rsplit("/", 1)[-1]
+
+def legacy_rewrite(content):
+    soup = BeautifulSoup(content, "html.parser")
+    for img in soup.find_all("img"):
+        src = img.get("src")
+        if src and src.startswith("http"):
+            img["src"] = replacement(src)
+            if not img.get("alt"):
+                img["alt"] = "图片"
+    return str(soup)
+
+def splice_rewrite(content):
+    return rewrite_images(
+        content,
+        lambda src: replacement(src) if src.startswith("http") else None,
+        default_alt="图片",
+    )
+
+def images_of(content):
+    return [(img.get("src"), img.get("alt")) for img in BeautifulSoup(content, "html.parser").find_all("img")]
+
+def outside_images(content):
+    return re.sub(r"<img[^>]*>", "", content)
+
+def bench(label, func, content):
+    seconds = timeit.timeit(lambda: func(content), number=NUMBER) / NUMBER
+    print(f"{label:<36}{seconds * 1000:>10.2f} ms/article")
+    return seconds
+
+def main():
+    for size in SIZES:
+        content = build_article(size)
+        legacy = legacy_rewrite(content)
+        spliced = splice_rewrite(content)
+        assert images_of(legacy) == images_of(spliced)
+        assert outside_images(spliced) == outside_images(content)
+        assert len(image_sources(content)) == len(images_of(content))
+
+        print(f"article: {len(content.encode('utf-8')) // 1024} KB, {len(images_of(content))} images")
+        legacy_time = bench("rewrite (BeautifulSoup)", legacy_rewrite, content)
+        splice_time = bench("rewrite (html.parser splice)", splice_rewrite, content)
+        print(f"{'speedup':<36}{legacy_time / splice_time:>10.2f}x")
+        # 新方式在 img 标签以外逐字节保留，旧方式会重新序列化整篇文章
+        print(f"{'legacy keeps markup outside img':<36}{outside_images(legacy) == outside_images(content)!s:>10}")
+
+if __name__ == "__main__":
+    main()
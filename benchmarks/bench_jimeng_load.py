@@ -0,0 +1,122 @@
+"""即梦客户端的离线压测
+
+在本地启动 benchmarks.jimeng_mock_server，用 N 个并发的 generate_image
+调用驱动它，报告吞吐量、p50/p99 延迟和每次生成发出的请求数。
+
+为了在CI中快速完成，模拟服务的生成时间、轮询调度器的各项间隔和限流速率
+按同一个 --time-scale 缩放，请求数等比例指标不受缩放影响。
+
+运行：python -m benchmarks.bench_jimeng_load --jobs 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.jimeng_mock_server import MockJimengServer
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+async def drive(args):
+    # 模拟服务地址在导入前通过环境变量注入
+    from tools.jimeng import jimeng_generator as jimeng
+    from tools.jimeng.metrics import get_metrics
+    from tools.jimeng.poll_scheduler import DEFAULT_INITIAL_DELAYS, DEFAULT_TIMEOUT, PollScheduler
+    from tools.jimeng.rate_limiter import DEFAULT_RATES, configure_rate_limits
+
+    scale = args.time_scale
+    loop = asyncio.get_running_loop()
+    jimeng._trackers[loop] = jimeng.GenerationTracker(PollScheduler(
+        initial_delays={model: delay * scale for model, delay in DEFAULT_INITIAL_DELAYS.items()},
+        base_interval=1.0 * scale,
+        max_interval=8.0 * scale,
+        timeout=DEFAULT_TIMEOUT * scale,
+    ))
+    configure_rate_limits({name: rate / scale for name, rate in DEFAULT_RATES.items()}, args.max_requests)
+    get_metrics().reset()
+
+    cookies = [f"sessionid=bench{i:04d}" for i in range(args.accounts)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], {}
+
+    async def one(index):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await jimeng.generate_image(
+                    cookies[index % len(cookies)],
+                    f"bench prompt {index}",
+                    model=args.model,
+                )
+            except Exception as e:
+                name = getattr(e, "code", type(e).__name__)
+                errors[name] = errors.get(name, 0) + 1
+            else:
+                latencies.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(args.jobs)))
+    elapsed = time.monotonic() - started
+    await jimeng.close_client()
+    return elapsed, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="即梦客户端离线压测")
+    parser.add_argument("--jobs", type=int, default=200, help="generate_image 调用总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="同时进行的调用数")
+    parser.add_argument("--accounts", type=int, default=8, help="分摊调用的模拟账号数")
+    parser.add_argument("--model", default="jimeng-2.1")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="时间缩放系数")
+    parser.add_argument("--max-requests", type=int, default=16, help="客户端全局并发请求上限")
+    parser.add_argument("--generation-time", type=float, default=6.0, help="模拟的生成时间（未缩放，秒）")
+    parser.add_argument("--queue-time", type=float, default=0.0, help="模拟的排队时间（未缩放，秒）")
+    parser.add_argument("--submit-latency", type=float, default=0.05, help="提交接口延迟（秒）")
+    parser.add_argument("--poll-latency", type=float, default=0.02, help="查询接口延迟（秒）")
+    parser.add_argument("--insufficient-points-rate", type=float, default=0.0, help="ret=5000 的概率")
+    parser.add_argument("--filtered-rate", type=float, default=0.0, help="fail_code=2038 的概率")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    server = MockJimengServer(
+        submit_latency=args.submit_latency,
+        poll_latency=args.poll_latency,
+        queue_time=args.queue_time * args.time_scale,
+        generation_time=args.generation_time * args.time_scale,
+        insufficient_points_rate=args.insufficient_points_rate,
+        filtered_rate=args.filtered_rate,
+        seed=0,
+    ).start()
+    os.environ["JIMENG_BASE_URL"] = server.url
+    try:
+        elapsed, latencies, errors = asyncio.run(drive(args))
+    finally:
+        server.stop()
+
+    stats = server.stats()
+    total_requests = sum(stats.values())
+    report = {
+        "jobs": args.jobs,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_p50_seconds": round(percentile(latencies, 0.5) or 0, 3),
+        "latency_p99_seconds": round(percentile(latencies, 0.99) or 0, 3),
+        "requests_per_generation": round(total_requests / args.jobs, 2) if args.jobs else None,
+        "requests": stats,
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"{key:<28}{value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""即梦请求体构建的微基准
+
+对比逐次构建嵌套字典并 json.dumps 的旧方式与预序列化模板的耗时，
+并校验两种方式生成的请求体内容一致。
+
+运行：python -m benchmarks.bench_jimeng_payload
+"""
+import json
+import time
+import timeit
+import uuid
+
+from tools.jimeng.jimeng_generator import (
+    DEFAULT_ASSISTANT_ID,
+    DRAFT_CONTENT_TEMPLATE,
+    DRAFT_VERSION,
+    GENERATE_BODY_TEMPLATE,
+    HISTORY_QUERY_TEMPLATE,
+    build_image_info,
+)
+
+NUMBER = 20000
+HISTORY_IDS = [str(10000000 + i) for i in range(8)]
+PROMPT = "一只在雪山上奔跑的柴犬，电影光效，细节丰富"
+MODEL = "high_aes_general_v21_L:general_v2.1_L"
+
+def legacy_history_query(ids):
+    return json.dumps({
+        "history_ids": ids,
+        "image_info": build_image_info(),
+        "http_common_info": {
+            "aid": int(DEFAULT_ASSISTANT_ID),
+        }
+    })
+
+def template_history_query(ids):
+    return HISTORY_QUERY_TEMPLATE.render(history_ids=ids)
+
+def legacy_generate_body(ids):
+    return json.dumps({
+        "extend": {
+            "root_model": MODEL,
+            "template_id": ""
+        },
+        "submit_id": ids["submit_id"],
+        "metrics_extra": json.dumps({
+            "templateId": "",
+            "generateCount": 1,
+            "promptSource": "custom",
+            "templateSource": "",
+            "lastRequestId": "",
+            "originRequestId": ""
+        }),
+        "draft_content": json.dumps({
+            "type": "draft",
+            "id": ids["draft_id"],
+            "min_version": DRAFT_VERSION,
+            "is_from_tsn": True,
+            "version": DRAFT_VERSION,
+            "main_component_id": ids["component_id"],
+            "component_list": [{
+                "type": "image_base_component",
+                "id": ids["component_id"],
+                "min_version": DRAFT_VERSION,
+                "generate_type": "generate",
+                "aigc_mode": "workbench",
+                "abilities": {
+                    "type": "",
+                    "id": ids["abilities_id"],
+                    "generate": {
+                        "type": "",
+                        "id": ids["generate_id"],
+                        "core_param": {
+                            "type": "",
+                            "id": ids["core_param_id"],
+                            "model": MODEL,
+                            "prompt": PROMPT,
+                            "negative_prompt": "",
+                            "seed": ids["seed"],
+                            "sample_strength": 0.75,
+                            "image_ratio": 1,
+                            "large_image_info": {
+                                "type": "",
+                                "id": ids["large_image_info_id"],
+                                "height": 1024,
+                                "width": 1024
+                            }
+                        },
+                        "history_option": {
+                            "type": "",
+                            "id": ids["history_option_id"]
+                        }
+                    }
+                }
+            }]
+        }),
+        "http_common_info": {
+            "aid": int(DEFAULT_ASSISTANT_ID)
+        }
+    })
+
+def template_generate_body(ids):
+    draft_content = DRAFT_CONTENT_TEMPLATE.render(
+        model=MODEL,
+        prompt=PROMPT,
+        negative_prompt="",
+        sample_strength=0.75,
+        height=1024,
+        width=1024,
+        **{k: v for k, v in ids.items() if k != "submit_id"},
+    )
+    return GENERATE_BODY_TEMPLATE.render(
+        model=MODEL,
+        submit_id=ids["submit_id"],
+        draft_content=draft_content,
+    )
+
+def make_ids():
+    ids = {
+        name: str(uuid.uuid4())
+        for name in (
+            "submit_id", "draft_id", "component_id", "abilities_id", "generate_id",
+            "core_param_id", "large_image_info_id", "history_option_id",
+        )
+    }
+    ids["seed"] = int(time.time() * 1000) % 100000000 + 2500000000
+    return ids
+
+def check_equivalent(ids):
+    assert json.loads(legacy_history_query(HISTORY_IDS)) == json.loads(template_history_query(HISTORY_IDS))
+    legacy = json.loads(legacy_generate_body(ids))
+    template = json.loads(template_generate_body(ids))
+    assert json.loads(legacy.pop("draft_content")) == json.loads(template.pop("draft_content"))
+    assert legacy == template
+
+def bench(label, func, arg):
+    seconds = timeit.timeit(lambda: func(arg), number=NUMBER)
+    per_call = seconds / NUMBER * 1e6
+    print(f"{label:<28}{per_call:>10.2f} us/call")
+    return per_call
+
+def main():
+    ids = make_ids()
+    check_equivalent(ids)
+
+    legacy = bench("history query (legacy)", legacy_history_query, HISTORY_IDS)
+    template = bench("history query (template)", template_history_query, HISTORY_IDS)
+    print(f"{'speedup':<28}{legacy / template:>10.2f}x")
+
+    legacy = bench("generate body (legacy)", legacy_generate_body, ids)
+    template = bench("generate body (template)", template_generate_body, ids)
+    print(f"{'speedup':<28}{legacy / template:>10.2f}x")
+
+if __name__ == "__main__":
+    main()
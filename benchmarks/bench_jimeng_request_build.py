@@ -0,0 +1,74 @@
+"""即梦请求头和URL参数构建的微基准
+
+对比每次重新计算签名并构建完整请求头/参数字典的旧方式，
+与按（URI后缀, 秒）缓存签名并复用只读基础请求头的新方式，
+并校验两种方式生成的请求头一致。
+
+运行：python -m benchmarks.bench_jimeng_request_build
+"""
+import time
+import timeit
+
+from tools.jimeng.jimeng_generator import (
+    BASE_PARAMS,
+    DEFAULT_ASSISTANT_ID,
+    PLATFORM_CODE,
+    VERSION_CODE,
+    WEB_ID,
+    build_headers,
+    get_sign,
+)
+
+NUMBER = 100000
+URIS = ["/mweb/v1/get_history_by_ids", "/mweb/v1/aigc_draft/generate"]
+COOKIE = "sessionid=0123456789abcdef0123456789abcdef"
+
+def legacy_build(uri):
+    device_time = int(time.time())
+    sign = get_sign(uri, PLATFORM_CODE, VERSION_CODE, device_time)
+    params = {
+        "aid": DEFAULT_ASSISTANT_ID,
+        "device_platform": "web",
+        "region": "CN",
+        "web_id": WEB_ID,
+    }
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+        "Cookie": COOKIE,
+        "Device-Time": str(device_time),
+        "Sign": sign,
+        "Sign-Ver": "1",
+        "Pf": PLATFORM_CODE,
+        "Referer": "https://jimeng.jianying.com",
+        "Appid": DEFAULT_ASSISTANT_ID,
+        "Appvr": VERSION_CODE,
+    }
+    return params, headers
+
+def cached_build(uri):
+    return BASE_PARAMS, build_headers(uri, COOKIE)
+
+def bench(label, func):
+    uris = URIS
+    def run():
+        for uri in uris:
+            func(uri)
+    seconds = timeit.timeit(run, number=NUMBER // len(uris))
+    per_call = seconds / NUMBER * 1e6
+    print(f"{label:<28}{per_call:>10.2f} us/request")
+    return per_call
+
+def main():
+    for uri in URIS:
+        legacy_params, legacy_headers = legacy_build(uri)
+        params, headers = cached_build(uri)
+        if legacy_headers["Device-Time"] == headers["Device-Time"]:
+            assert legacy_headers == headers
+        assert legacy_params == dict(params)
+
+    legacy = bench("request build (legacy)", legacy_build)
+    cached = bench("request build (cached)", cached_build)
+    print(f"{'speedup':<28}{legacy / cached:>10.2f}x")
+
+if __name__ == "__main__":
+    main()
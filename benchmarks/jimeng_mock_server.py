@@ -0,0 +1,217 @@
+"""即梦接口的本地模拟服务
+
+实现 /mweb/v1/aigc_draft/generate、/mweb/v1/get_history_by_ids 和
+/commerce/v1/benefits/user_credit，可配置接口延迟、错误码（5000 积分不足、
+2038 内容被过滤）以及排队 -> 生成中 -> 完成的状态变化，用于在没有真实服务时
+测试和压测 tools.jimeng.jimeng_generator。
+
+单独运行：python -m benchmarks.jimeng_mock_server --port 8765
+然后设置 JIMENG_BASE_URL=http://127.0.0.1:8765 再使用即梦工具。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+STATUS_PENDING = 20
+STATUS_FAILED = 30
+STATUS_SUCCEEDED = 50
+
+class MockJob:
+    """模拟的生成任务"""
+
+    def __init__(self, created_at: float, queue_time: float, generation_time: float, filtered: bool, images: int):
+        self.created_at = created_at
+        self.queue_time = queue_time
+        self.generation_time = generation_time
+        self.filtered = filtered
+        self.images = images
+
+    def record(self, history_id: str, now: float) -> Dict[str, Any]:
+        """按经过的时间生成 get_history_by_ids 返回的记录"""
+        elapsed = now - self.created_at
+        if elapsed < self.queue_time:
+            length = max(1, int(self.queue_time))
+            return {
+                "status": STATUS_PENDING,
+                "queue_info": {
+                    "queue_idx": max(1, int(length * (1 - elapsed / self.queue_time))),
+                    "queue_length": length,
+                },
+            }
+        if elapsed < self.queue_time + self.generation_time:
+            return {"status": STATUS_PENDING, "queue_info": {"queue_idx": 0}}
+        if self.filtered:
+            return {"status": STATUS_FAILED, "fail_code": "2038"}
+        return {
+            "status": STATUS_SUCCEEDED,
+            "item_list": [
+                {"image": {"large_images": [{"image_url": f"https://mock.jimeng/{history_id}/{i}.webp"}]}}
+                for i in range(self.images)
+            ],
+        }
+
+class MockJimengServer(ThreadingHTTPServer):
+    """即梦模拟服务
+
+    每个请求在独立线程中处理，延迟用 sleep 模拟；stats() 返回各接口的请求数。
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        submit_latency: float = 0.05,
+        poll_latency: float = 0.02,
+        queue_time: float = 0.0,
+        generation_time: float = 6.0,
+        generation_jitter: float = 0.2,
+        insufficient_points_rate: float = 0.0,
+        filtered_rate: float = 0.0,
+        images: int = 4,
+        seed: Optional[int] = None,
+    ):
+        """初始化
+
+        Args:
+            address: 监听地址，端口为0时随机分配
+            submit_latency: 提交接口的响应延迟（秒）
+            poll_latency: 查询接口的响应延迟（秒）
+            queue_time: 提交后的排队时间（秒）
+            generation_time: 排队结束后的生成时间（秒）
+            generation_jitter: 生成时间的随机浮动比例
+            insufficient_points_rate: 提交返回 ret=5000（积分不足）的概率
+            filtered_rate: 生成结果为 fail_code=2038（内容被过滤）的概率
+            images: 每个任务生成的图片数
+            seed: 随机数种子
+        """
+        super().__init__(address, MockJimengHandler)
+        self.submit_latency = submit_latency
+        self.poll_latency = poll_latency
+        self.queue_time = queue_time
+        self.generation_time = generation_time
+        self.generation_jitter = generation_jitter
+        self.insufficient_points_rate = insufficient_points_rate
+        self.filtered_rate = filtered_rate
+        self.images = images
+        self.random = random.Random(seed)
+        self.jobs: Dict[str, MockJob] = {}
+        self.requests: Counter = Counter()
+        self.lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockJimengServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.serve_forever, name="jimeng-mock", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        self.shutdown()
+        self.server_close()
+
+    def stats(self) -> Dict[str, int]:
+        """各接口的请求数"""
+        with self.lock:
+            return dict(self.requests)
+
+    def submit(self) -> Dict[str, Any]:
+        with self.lock:
+            if self.random.random() < self.insufficient_points_rate:
+                return {"ret": "5000", "errmsg": "credit not enough"}
+            history_id = uuid.uuid4().hex
+            jitter = 1 + self.random.uniform(-self.generation_jitter, self.generation_jitter)
+            self.jobs[history_id] = MockJob(
+                time.monotonic(),
+                self.queue_time,
+                self.generation_time * jitter,
+                self.random.random() < self.filtered_rate,
+                self.images,
+            )
+        return {"ret": "0", "data": {"aigc_data": {"history_record_id": history_id}}}
+
+    def history(self, history_ids: List[str]) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            jobs = {history_id: self.jobs.get(history_id) for history_id in history_ids}
+        return {
+            "ret": "0",
+            "data": {history_id: job.record(history_id, now) for history_id, job in jobs.items() if job},
+        }
+
+class MockJimengHandler(BaseHTTPRequestHandler):
+    """模拟服务的请求处理"""
+
+    protocol_version = "HTTP/1.1"
+    server: MockJimengServer
+
+    def do_POST(self) -> None:
+        path = self.path.split("?", 1)[0]
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests[path] += 1
+
+        if path == "/mweb/v1/aigc_draft/generate":
+            time.sleep(self.server.submit_latency)
+            self._reply(self.server.submit())
+        elif path == "/mweb/v1/get_history_by_ids":
+            time.sleep(self.server.poll_latency)
+            self._reply(self.server.history(body.get("history_ids") or []))
+        elif path == "/commerce/v1/benefits/user_credit":
+            self._reply({"ret": "0", "data": {"credit": {"gift_credit": 100}}})
+        else:
+            self._reply({"ret": "1", "errmsg": f"unknown path {path}"}, status=404)
+
+    def _reply(self, payload: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="即梦接口的本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--submit-latency", type=float, default=0.05)
+    parser.add_argument("--poll-latency", type=float, default=0.02)
+    parser.add_argument("--queue-time", type=float, default=0.0)
+    parser.add_argument("--generation-time", type=float, default=6.0)
+    parser.add_argument("--insufficient-points-rate", type=float, default=0.0)
+    parser.add_argument("--filtered-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockJimengServer(
+        (args.host, args.port),
+        submit_latency=args.submit_latency,
+        poll_latency=args.poll_latency,
+        queue_time=args.queue_time,
+        generation_time=args.generation_time,
+        insufficient_points_rate=args.insufficient_points_rate,
+        filtered_rate=args.filtered_rate,
+    )
+    print(f"jimeng mock listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
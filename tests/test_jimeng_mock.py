@@ -0,0 +1,184 @@
+"""基于 benchmarks.jimeng_mock_server 的即梦客户端回归测试
+
+运行：python -m pytest tests
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.jimeng_mock_server import MockJimengServer
+from tools.jimeng import jimeng_generator as jimeng
+from tools.jimeng.cookie_pool import CookiePool, fingerprint
+from tools.jimeng.job_journal import STATE_FAILED, JobJournal
+from tools.jimeng.poll_scheduler import PollScheduler
+from tools.jimeng.result_cache import ResultCache
+from tools.jimeng.rate_limiter import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATES, configure_rate_limits
+
+@pytest.fixture
+def server(monkeypatch):
+    server = MockJimengServer(submit_latency=0, poll_latency=0, generation_time=0.2, images=1, seed=0).start()
+    monkeypatch.setattr(jimeng, "BASE_URL", server.url)
+    configure_rate_limits({name: 1000.0 for name in DEFAULT_RATES}, DEFAULT_MAX_CONCURRENCY)
+    yield server
+    configure_rate_limits(DEFAULT_RATES, DEFAULT_MAX_CONCURRENCY)
+    server.stop()
+
+def run(coro_fn):
+    """在新的事件循环中运行，轮询间隔缩短到毫秒级"""
+    async def main():
+        jimeng._trackers[asyncio.get_running_loop()] = jimeng.GenerationTracker(
+            PollScheduler(initial_delays={}, base_interval=0.05, max_interval=0.1, timeout=10))
+        try:
+            return await coro_fn()
+        finally:
+            await jimeng.close_client()
+    return asyncio.run(main())
+
+async def collect(agen):
+    return [item async for item in agen]
+
+def test_batch_drafts_are_not_coalesced(server):
+    results = run(lambda: collect(jimeng.generate_images("sessionid=a", ["cat"], count=3)))
+
+    assert server.stats()["/mweb/v1/aigc_draft/generate"] == 3
+    urls = [tuple(r["urls"]) for r in results]
+    assert len(set(urls)) == 3
+
+def test_identical_requests_from_different_accounts_are_not_coalesced(server):
+    async def both():
+        return await asyncio.gather(
+            jimeng.generate_image("sessionid=a", "cat"),
+            jimeng.generate_image("sessionid=b", "cat"),
+            jimeng.generate_image("sessionid=b", "cat"),
+        )
+    a, b1, b2 = run(both)
+
+    # 同一账号的相同请求仍然合并，不同账号各自提交
+    assert server.stats()["/mweb/v1/aigc_draft/generate"] == 2
+    assert b1 == b2
+    assert a != b1
+
+def test_malformed_record_fails_only_its_own_waiter(server):
+    history = server.history
+    broken = []
+
+    def patched(history_ids):
+        result = history(history_ids)
+        for history_id in broken:
+            record = result["data"].get(history_id)
+            if record and record["status"] != jimeng.STATUS_PENDING:
+                record["item_list"] = [{"image": {"large_images": []}}, {"image": None}]
+        return result
+    server.history = patched
+
+    async def both():
+        bad = await jimeng.submit_generation("sessionid=a", "broken")
+        broken.append(bad)
+        good = await jimeng.submit_generation("sessionid=a", "fine")
+        # 外层超时防止追踪器失效时测试一直挂起
+        return await asyncio.wait_for(asyncio.gather(
+            jimeng.wait_for_generation("sessionid=a", bad, timeout=3),
+            jimeng.wait_for_generation("sessionid=a", good, timeout=3),
+            return_exceptions=True,
+        ), 5)
+    bad, good = run(both)
+
+    assert isinstance(bad, jimeng.APIException)
+    assert good and all(url.startswith("https://mock.jimeng/") for url in good)
+
+def test_tracker_failure_settles_waiters(server, monkeypatch):
+    async def boom(self, cookie, history_ids):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(jimeng.GenerationTracker, "_poll", boom)
+
+    async def wait():
+        history_id = await jimeng.submit_generation("sessionid=a", "cat")
+        return await asyncio.wait_for(jimeng.wait_for_generation("sessionid=a", history_id, timeout=3), 5)
+    with pytest.raises(RuntimeError):
+        run(wait)
+
+def test_stale_pending_job_is_resubmitted(server, tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    key = jimeng.params_key("jimeng-2.1", "cat", "", 1024, 1024, 0.75)
+    journal.record_submitted("gone", fingerprint("sessionid=a"), "jimeng-2.1", {"prompt": "cat"}, key)
+
+    urls = run(lambda: jimeng.generate_image("sessionid=a", "cat", journal=journal))
+
+    assert urls and server.stats()["/mweb/v1/aigc_draft/generate"] == 1
+    assert journal.get("gone")["state"] == STATE_FAILED
+    # 超过接续时限的任务不再查找
+    journal.record_submitted("old", fingerprint("sessionid=a"), "jimeng-2.1", {"prompt": "cat"}, key)
+    assert journal.find_pending(key, [fingerprint("sessionid=a")], max_age=-1) is None
+
+def test_fetch_marks_only_the_failed_account(server, tmp_path, monkeypatch):
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    pool = CookiePool(["sessionid=a", "sessionid=b"])
+    get_history_by_ids = jimeng.get_history_by_ids
+
+    async def flaky(cookie, history_ids):
+        if cookie == "sessionid=b":
+            raise httpx.ConnectError("connection refused")
+        return await get_history_by_ids(cookie, history_ids)
+    monkeypatch.setattr(jimeng, "get_history_by_ids", flaky)
+
+    async def submit_and_fetch():
+        ids = []
+        for cookie in ("sessionid=a", "sessionid=b"):
+            history_id = await jimeng.submit_generation(cookie, "cat")
+            journal.record_submitted(history_id, fingerprint(cookie), "jimeng-2.1", {"prompt": "cat"})
+            ids.append(history_id)
+        return ids, await jimeng.fetch_generations(pool, ids, journal=journal)
+    (a, b), results = run(submit_and_fetch)
+
+    assert results[a]["status"] == "pending"
+    assert results[b] == {"status": "error", "error": "connection refused"}
+
+def test_transient_poll_failure_is_retried(server, monkeypatch):
+    get_history_by_ids = jimeng.get_history_by_ids
+    failures = []
+
+    async def flaky(cookie, history_ids):
+        if not failures:
+            failures.append(history_ids)
+            raise httpx.ReadTimeout("timed out")
+        return await get_history_by_ids(cookie, history_ids)
+    monkeypatch.setattr(jimeng, "get_history_by_ids", flaky)
+
+    async def both():
+        return await asyncio.wait_for(asyncio.gather(
+            jimeng.generate_image("sessionid=a", "cat"),
+            jimeng.generate_image("sessionid=a", "dog"),
+        ), 5)
+    cat, dog = run(both)
+
+    assert failures and cat and dog
+    assert server.stats()["/mweb/v1/aigc_draft/generate"] == 2
+
+def test_requests_with_different_timeouts_are_not_coalesced(server):
+    async def both():
+        return await asyncio.gather(
+            jimeng.generate_image("sessionid=a", "cat", timeout=0.01),
+            jimeng.generate_image("sessionid=a", "cat", timeout=5),
+            return_exceptions=True,
+        )
+    short, long = run(both)
+
+    assert isinstance(short, jimeng.APIException)
+    assert short.code == jimeng.ErrorCode.API_IMAGE_GENERATION_TIMEOUT
+    assert isinstance(long, list) and long
+
+def test_result_cache_is_scoped_to_account_and_seed(server, tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+
+    async def generate():
+        first = await jimeng.generate_image("sessionid=a", "cat", seed=7, cache=cache)
+        again = await jimeng.generate_image("sessionid=a", "cat", seed=7, cache=cache)
+        other = await jimeng.generate_image("sessionid=b", "cat", seed=7, cache=cache)
+        unseeded = await jimeng.generate_image("sessionid=a", "cat", cache=cache)
+        return first, again, other, unseeded
+    first, again, other, unseeded = run(generate)
+
+    assert first == again
+    assert other != first and unseeded != first
+    assert server.stats()["/mweb/v1/aigc_draft/generate"] == 3
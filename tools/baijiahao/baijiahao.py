@@ -1,19 +1,28 @@
-from collections.abc import Generator
+from collections.abc import Generator, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from typing import Any
+import json
+import threading
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from tools.baijiahao.baijiahao_publisher import BaijiahaoPublisher
+from tools.baijiahao.baijiahao_publisher import BaijiahaoPublisher, get_publisher
+
+# 批量模式下同时保存草稿的文章数
+DEFAULT_BATCH_CONCURRENCY = 4
+# 批量模式下同时发布的文章数
+DEFAULT_PUBLISH_CONCURRENCY = 2
 
 class BaijiahaoTool(Tool):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         cookies = tool_parameters.get('cookies')
         title = tool_parameters.get('title')
         content = tool_parameters.get('content')
         cover_image = tool_parameters.get('cover_image')
-        
+        articles = tool_parameters.get('articles')
+
         # 获取配置参数
         auto_publish = tool_parameters.get('auto_publish', '1') == '1'
         enable_ttv = tool_parameters.get('enable_ttv', '1') == '1'
@@ -21,48 +30,85 @@ class BaijiahaoTool(Tool):
         is_aigc = tool_parameters.get('is_aigc', '0') == '1'
         allow_reprint = tool_parameters.get('allow_reprint', '0') == '1'
         cover_layout = tool_parameters.get('cover_layout', 'one')
-        
+
         # 获取新增的图片处理参数
         abstract_from = tool_parameters.get('abstract_from', '3')
         enable_beautify = tool_parameters.get('enable_beautify', 'false')
         enable_filter = tool_parameters.get('enable_filter', 'false')
-        
+
         # 获取摘要相关参数
         abstract = tool_parameters.get('abstract', '')
-        
+
+        # 所有文章共用的发布参数
+        publish_options = {
+            'activity_list': [
+                {"id": "ttv", "is_checked": "1" if enable_ttv else "0"},
+                {"id": "reward", "is_checked": "1" if enable_reward else "0"},
+                {"id": "aigc_bjh_status", "is_checked": "1" if is_aigc else "0"}
+            ],
+            'source_reprinted_allow': "1" if allow_reprint else "0",
+            'cover_layout': cover_layout,
+            'abstract_from': abstract_from,
+            'abstract': abstract,
+            'isBeautify': enable_beautify,
+            'usingImgFilter': enable_filter
+        }
+
         try:
-            # 初始化发布器
-            publisher = BaijiahaoPublisher()
-            publisher.set_main_cookies(cookies)
-            
+            # 获取共享的发布器，复用同一账号的连接和token
+            publisher = get_publisher(cookies)
+
+            if articles:
+                # 批量模式：共用会话和上传线程池，每完成一篇就返回一条消息
+                total = failed = 0
+                results = self._publish_articles(
+                    publisher,
+                    self._parse_articles(articles),
+                    publish_options,
+                    auto_publish,
+                    int(tool_parameters.get('batch_concurrency') or DEFAULT_BATCH_CONCURRENCY),
+                    int(tool_parameters.get('publish_concurrency') or DEFAULT_PUBLISH_CONCURRENCY)
+                )
+                for item in results:
+                    total += 1
+                    if item['status'] == '失败':
+                        failed += 1
+                    yield ToolInvokeMessage(
+                        type="json",
+                        message={
+                            "json_object": item
+                        }
+                    )
+                yield ToolInvokeMessage(
+                    type="text",
+                    message={
+                        "text": f"共{total}篇文章，成功{total - failed}篇，失败{failed}篇"
+                    }
+                )
+                return
+
+            if not title or not content:
+                raise Exception('请提供文章标题和内容')
+
             # 处理封面图片
             cover_images = []
             if cover_image:
-                # 分割图片路径
-                image_paths = [p.strip() for p in cover_image.split(',')]
-                
-                # 根据布局检查图片数量
-                if cover_layout == 'three' and len(image_paths) < 3:
-                    raise Exception('三图布局需要提供3张图片路径，以逗号分隔')
-                elif cover_layout == 'one' and len(image_paths) < 1:
-                    raise Exception('单图布局需要提供至少1张图片路径')
-                    
-                # 上传图片
-                for path in image_paths[:3]:  # 最多取前3张
-                    images = publisher.upload_image(path)
-                    if images:
-                        cover_images.append({
-                            "src": images[0]["url"],
-                            "machine_chooseimg": 0,
-                            "isLegal": 0
-                        })
-            
+                # 并发上传图片，最多取前3张
+                results = publisher.upload_images(self._cover_paths(cover_image, cover_layout))
+                publisher.check_upload_results(results)
+                for r in results:
+                    cover_images.append({
+                        "src": r["url"],
+                        "machine_chooseimg": 0,
+                        "isLegal": 0
+                    })
+
             # 保存文章
             save_result = publisher.save_article(
                 title=title,
                 content=content
             )
-            
+
             if auto_publish:
                 # 发布文章
                 result = publisher.publish_article(
@@ -70,23 +116,13 @@ class BaijiahaoTool(Tool):
                     title=title,
                     content=content,
                     cover_images=cover_images,
-                    activity_list=[
-                        {"id": "ttv", "is_checked": "1" if enable_ttv else "0"},
-                        {"id": "reward", "is_checked": "1" if enable_reward else "0"},
-                        {"id": "aigc_bjh_status", "is_checked": "1" if is_aigc else "0"}
-                    ],
-                    source_reprinted_allow="1" if allow_reprint else "0",
-                    cover_layout=cover_layout,
-                    abstract_from=abstract_from,
-                    abstract=abstract,
-                    isBeautify=enable_beautify,
-                    usingImgFilter=enable_filter
+                    **publish_options
                 )
                 status = "已发布"
             else:
                 status = "已保存到草稿箱"
                 result = save_result
-            
+
             yield ToolInvokeMessage(
                 type="text",
                 message={
@@ -94,7 +130,7 @@ class BaijiahaoTool(Tool):
                     "json": result
                 }
             )
-            
+
         except Exception as e:
             yield ToolInvokeMessage(
                 type="text",
@@ -102,4 +138,127 @@ class BaijiahaoTool(Tool):
                     "text": f"发布失败：{str(e)}"
                 }
             )
-            raise e
\ No newline at end of file
+            raise e
+
+    def _publish_articles(
+        self,
+        publisher: BaijiahaoPublisher,
+        articles: list[dict[str, Any]],
+        publish_options: dict[str, Any],
+        auto_publish: bool,
+        batch_concurrency: int,
+        publish_concurrency: int,
+    ) -> Iterator[dict[str, Any]]:
+        """批量保存并发布文章，按完成顺序逐篇返回结果
+
+        所有文章的正文图片和封面按文章顺序提交到同一个上传线程池（相同地址只上传一次），
+        每篇文章只等待自己的图片，随后保存草稿，发布则限制同时进行的数量。
+        单篇失败不影响其他文章。
+
+        Args:
+            publisher: 发布器
+            articles: 文章列表，每篇包含 title、content，可选 cover_image、cover_layout、abstract
+            publish_options: 所有文章共用的发布参数
+            auto_publish: 是否在保存后发布
+            batch_concurrency: 同时保存草稿的文章数
+            publish_concurrency: 同时发布的文章数
+
+        Yields:
+            单篇文章的结果，包含 index、title、status，以及 article_id、draft_link、result 或 error
+        """
+        # 先把所有图片提交上传，文章处理时只等待自己用到的图片
+        plans = []
+        uploads: dict[str, Future] = {}
+        for article in articles:
+            layout = article.get('cover_layout') or publish_options['cover_layout']
+            try:
+                covers = self._cover_paths(article.get('cover_image'), layout) if article.get('cover_image') else []
+            except Exception as e:
+                plans.append({'error': str(e)})
+                continue
+            images = publisher.content_image_sources(article['content'])
+            for source in covers + images:
+                if source not in uploads:
+                    uploads[source] = publisher.submit_upload(source)
+            plans.append({'covers': covers, 'images': images, 'cover_layout': layout})
+
+        publish_slots = threading.Semaphore(max(1, publish_concurrency))
+
+        def run(index: int) -> dict[str, Any]:
+            article, plan = articles[index], plans[index]
+            result = {'index': index, 'title': article['title']}
+            try:
+                if 'error' in plan:
+                    raise Exception(plan['error'])
+                uploaded = {s: uploads[s].result() for s in dict.fromkeys(plan['covers'] + plan['images'])}
+                publisher.check_upload_results(list(uploaded.values()))
+
+                # 图片已上传，这里只替换地址；保存和发布时命中已处理内容，不再上传
+                content = publisher.process_content_images(
+                    article['content'], {s: uploaded[s]['url'] for s in plan['images']})
+                save_result = publisher.save_article(title=article['title'], content=content)
+                result.update(article_id=save_result['article_id'], draft_link=save_result['draft_link'])
+                if not auto_publish:
+                    result['status'] = '已保存到草稿箱'
+                    return result
+
+                cover_images = [
+                    {"src": uploaded[s]['url'], "machine_chooseimg": 0, "isLegal": 0}
+                    for s in plan['covers']
+                ]
+                options = dict(publish_options, cover_layout=plan['cover_layout'])
+                if article.get('abstract'):
+                    options['abstract'] = article['abstract']
+                with publish_slots:
+                    result['result'] = publisher.publish_article(
+                        article_id=save_result['article_id'],
+                        title=article['title'],
+                        content=content,
+                        cover_images=cover_images,
+                        **options
+                    )
+                result['status'] = '已发布'
+            except Exception as e:
+                result.update(status='失败', error=str(e))
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, batch_concurrency), thread_name_prefix='bjh-batch') as executor:
+            tasks = [executor.submit(run, index) for index in range(len(articles))]
+            try:
+                for task in as_completed(tasks):
+                    yield task.result()
+            finally:
+                # 调用方提前停止时不再处理尚未开始的文章
+                for task in tasks:
+                    task.cancel()
+
+    @staticmethod
+    def _cover_paths(cover_image: Any, cover_layout: str) -> list[str]:
+        """解析封面图片路径，最多取前3张"""
+        # 分割图片路径
+        if isinstance(cover_image, list):
+            image_paths = [str(p).strip() for p in cover_image if str(p).strip()]
+        else:
+            image_paths = [p.strip() for p in cover_image.split(',')]
+
+        # 根据布局检查图片数量
+        if cover_layout == 'three' and len(image_paths) < 3:
+            raise Exception('三图布局需要提供3张图片路径，以逗号分隔')
+        elif cover_layout == 'one' and len(image_paths) < 1:
+            raise Exception('单图布局需要提供至少1张图片路径')
+        return image_paths[:3]
+
+    @staticmethod
+    def _parse_articles(value: Any) -> list[dict[str, Any]]:
+        """解析批量文章，JSON数组，每篇至少包含 title 和 content"""
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                raise Exception('批量文章格式错误，应为JSON数组')
+        if not isinstance(value, list):
+            raise Exception('批量文章格式错误，应为JSON数组')
+        for index, article in enumerate(value):
+            if not isinstance(article, dict) or not article.get('title') or not article.get('content'):
+                raise Exception(f'第{index + 1}篇文章缺少标题或内容')
+        return value
@@ -1,18 +1,67 @@
 import requests
+import hashlib
 import json
+import mimetypes
+import os
+import threading
 import time
-from typing import Dict, Any, List, Optional
-from bs4 import BeautifulSoup
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+from requests.adapters import HTTPAdapter
+from tools.baijiahao.upload_cache import UploadCache, get_upload_cache
+from tools.common.html_rewriter import image_sources, rewrite_images
+from tools.common.image_normalizer import normalize_image
+from tools.common.multipart import MultipartEncoder, SpooledImage, download_image, open_image
+
+# 编辑token的缓存时间（秒），过期或接口拒绝时重新获取
+TOKEN_TTL = 30 * 60
+# 编辑页中认证token的起始标记
+AUTH_MARK = b'window.__BJH__INIT__AUTH__="'
+# 流式读取编辑页的块大小
+TOKEN_CHUNK_SIZE = 16 * 1024
+# 同时下载和上传的图片数
+UPLOAD_WORKERS = 6
+# 上传前图片的大小和尺寸上限，超出时重新压缩（平台会压缩更大的图片）
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+IMAGE_MAX_SIDE = 2048
+# 保留的已处理文章内容数
+PROCESSED_CONTENT_CACHE_SIZE = 32
+# 认证失效时接口返回的错误信息关键词，只有这类错误才刷新token重试
+AUTH_ERROR_KEYWORDS = ('token', '登录', '未授权', '身份验证')
+# 进程内最多保留的发布器数（每个账号一个），超出时淘汰最久未使用的
+MAX_PUBLISHERS = 16
+# 发布器空闲超过该时间（秒）后淘汰
+PUBLISHER_IDLE_TTL = 30 * 60
 
 class BaijiahaoPublisher:
     """百家号发布工具类 - 新版实现"""
     
-    def __init__(self):
-        """初始化"""
+    def __init__(self, upload_cache: Optional[UploadCache] = None):
+        """初始化
+        
+        Args:
+            upload_cache: 图片上传缓存，提供时重复的图片跳过下载和上传
+        """
         self.version = '0.0.1'
         self.session = requests.Session()
+        self.upload_cache = upload_cache
+        self.account = None       # 账号指纹，用于区分上传缓存
         self.main_cookies = None  # 存储主认证信息
         self.edit_token = None    # 存储操作token
+        self.token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._upload_pool: Optional[ThreadPoolExecutor] = None
+        self._upload_pool_lock = threading.Lock()
+        # 内容SHA-256 -> 替换图片后的内容，保存草稿后发布时不再重复上传图片
+        self._processed_contents: "OrderedDict[str, str]" = OrderedDict()
+        self._processed_lock = threading.Lock()
+        self.last_used = time.monotonic()
+        
+        # 连接池大小与并发上传数匹配，避免并发请求时反复新建连接
+        adapter = HTTPAdapter(pool_maxsize=UPLOAD_WORKERS * 2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # 设置基础请求头
         self.session.headers.update({
@@ -28,6 +77,7 @@ class BaijiahaoPublisher:
             cookies: 完整的cookies字符串
         """
         self.main_cookies_str = cookies  # 保存完整的cookies字符串
+        self.account = hashlib.sha256(cookies.encode('utf-8')).hexdigest()[:12]
         
         # 同时也解析成字典形式
         cookie_dict = {}
@@ -38,35 +88,55 @@ class BaijiahaoPublisher:
         self.main_cookies = cookie_dict
         self.session.cookies.update(cookie_dict)
 
-        self.refresh_token()
+        self.ensure_token()
+        
+    def ensure_token(self) -> str:
+        """获取未过期的认证token，不存在或已过期时刷新"""
+        if self.edit_token and time.monotonic() < self.token_expires_at:
+            return self.edit_token
+        with self._token_lock:
+            # 等锁期间其他线程可能已经刷新
+            if self.edit_token and time.monotonic() < self.token_expires_at:
+                return self.edit_token
+            return self.refresh_token()
         
     def refresh_token(self) -> str:
         """刷新认证token"""
-        response = self.session.get('https://baijiahao.baidu.com/builder/rc/edit')
-        response.raise_for_status()
+        self.edit_token = self._get_auth_token()
+        self.token_expires_at = time.monotonic() + TOKEN_TTL
         
-        # 查找 auth token
-        mark_str = 'window.__BJH__INIT__AUTH__="'
-        auth_start = response.text.find(mark_str)
-        if auth_start == -1:
-            raise Exception('主认证已失效，请重新设置cookies')
-            
-        # 修改结束标记的查找方式
-        auth_end = response.text.find('",window.user_id=', auth_start)
-        if auth_end == -1:
-            auth_end = response.text.find('",window.__BJH__EDIT_', auth_start)
+        return self.edit_token
+    
+    @staticmethod
+    def _is_auth_error(result: Dict[str, Any]) -> bool:
+        """接口返回的是否为认证失效错误（内容校验等其他错误不应刷新token）"""
+        if result.get('errno', 0) == 0:
+            return False
+        errmsg = str(result.get('errmsg', '')).lower()
+        return any(keyword in errmsg for keyword in AUTH_ERROR_KEYWORDS)
+    
+    def _with_token(self, send: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """使用缓存的token发送请求，认证失效时刷新token后重试一次
         
-        if auth_end == -1:
-            raise Exception('无法提取token')
+        Args:
+            send: 以token为参数发送请求并返回解析后结果的函数
             
-        self.edit_token = response.text[auth_start + len(mark_str):auth_end]
-        
-        return self.edit_token
+        Returns:
+            接口返回结果
+        """
+        token = self.ensure_token()
+        result = send(token)
+        if self._is_auth_error(result):
+            with self._token_lock:
+                # 其他线程已经换了新token时直接重试
+                if self.edit_token == token:
+                    self.refresh_token()
+            result = send(self.edit_token)
+        return result
             
     def get_meta_data(self) -> Dict[str, Any]:
         """获取账号元数据"""
-        if not self.edit_token:
-            self.refresh_token()
+        self.ensure_token()
             
         url = f'https://baijiahao.baidu.com/builder/app/appinfo?_={int(time.time() * 1000)}'
         
@@ -98,20 +168,33 @@ class BaijiahaoPublisher:
             
             
     def _get_auth_token(self) -> str:
-        """获取认证 token"""
-        response = self.session.get('https://baijiahao.baidu.com/builder/rc/edit')
-        response.raise_for_status()
+        """从编辑页中提取认证 token
         
-        # 查找 auth token
-        mark_str = 'window.__BJH__INIT__AUTH__="'
-        auth_start = response.text.find(mark_str)
-        if auth_start == -1:
-            raise Exception('登录已失效')
+        流式读取页面，读到 window.__BJH__INIT__AUTH__ 的结束引号即停止并关闭连接，
+        不下载和解码整个页面。
+        """
+        with self.session.get('https://baijiahao.baidu.com/builder/rc/edit', stream=True) as response:
+            response.raise_for_status()
             
-        auth_end = response.text.find('",window.__BJH__EDIT_', auth_start)
-        auth_token = response.text[auth_start + len(mark_str):auth_end]
+            buffer = b''
+            value_start = -1
+            for chunk in response.iter_content(TOKEN_CHUNK_SIZE):
+                buffer += chunk
+                if value_start == -1:
+                    auth_start = buffer.find(AUTH_MARK)
+                    if auth_start == -1:
+                        # 只保留可能是标记前缀的尾部
+                        buffer = buffer[-(len(AUTH_MARK) - 1):]
+                        continue
+                    buffer = buffer[auth_start + len(AUTH_MARK):]
+                    value_start = 0
+                auth_end = buffer.find(b'"')
+                if auth_end != -1:
+                    return buffer[:auth_end].decode('utf-8')
         
-        return auth_token
+        if value_start == -1:
+            raise Exception('主认证已失效，请重新设置cookies')
+        raise Exception('无法提取token')
         
         
     def save_article(self,
@@ -128,32 +211,36 @@ class BaijiahaoPublisher:
             'type': 'news'
         }
         
-        # 更新请求头
-        headers = {
-            'Token': self.edit_token,
-            'Cookie': self.main_cookies_str,
-            'Content-Type': 'application/x-www-form-urlencoded',
-        }
+        def send(token: str) -> Dict[str, Any]:
+            # 更新请求头
+            headers = {
+                'Token': token,
+                'Cookie': self.main_cookies_str,
+                'Content-Type': 'application/x-www-form-urlencoded',
+            }
 
-        # 发送请求
-        response = self.session.post(
-            'https://baijiahao.baidu.com/pcui/article/save?callback=bjhdraft',
-            headers=headers,
-            cookies=self.main_cookies,
-            data=form_data
-        )
-        response.raise_for_status()
-        
-        # 处理 jsonp 响应
-        text = response.text
-        if text.startswith('bjhdraft('):
-            text = text[9:-1]
+            # 发送请求
+            response = self.session.post(
+                'https://baijiahao.baidu.com/pcui/article/save?callback=bjhdraft',
+                headers=headers,
+                cookies=self.main_cookies,
+                data=form_data
+            )
+            response.raise_for_status()
+            
+            # 处理 jsonp 响应
+            text = response.text
+            if text.startswith('bjhdraft('):
+                text = text[9:-1]
 
-        try:
-            result = json.loads(text)
-        except json.JSONDecodeError:
-            raise Exception("解析响应失败")
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                raise Exception("解析响应失败")
         
+        result = self._with_token(send)
+        if not result.get('ret'):
+            raise Exception(f"保存草稿失败: {result.get('errmsg', '')}")
         article_id = result['ret']['article_id']
         return {
             'status': 'success',
@@ -161,31 +248,50 @@ class BaijiahaoPublisher:
             'draft_link': f'https://baijiahao.baidu.com/builder/rc/edit?type=news&article_id={article_id}'
         }
     
-    def process_content_images(self, content: str) -> str:
+    def process_content_images(self, content: str, uploaded: Optional[Dict[str, str]] = None) -> str:
         """
         处理文章内容中的图片
         1. 查找所有img标签
         2. 上传图片
         3. 替换图片URL
+        
+        同一内容（包括已处理过的内容）再次处理时直接返回之前的结果。
+        
+        Args:
+            content: 文章内容
+            uploaded: 已经上传好的图片地址（来源URL -> 百家号地址），其中没有的图片才上传
         """
-        soup = BeautifulSoup(content, 'html.parser')
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src and src.startswith('http'):
-                # 检查图片格式
-                lower_src = src.lower()
-                if not any(lower_src.endswith(ext) for ext in ['.jpg', '.jpeg', '.png']):
-                    raise Exception(f'不支持的图片格式，仅支持 jpg、jpeg、png 格式: {src}')
-                
-                # 上传图片
-                images = self.upload_image(src)
-                if images and images[0].get('url'):
-                    # 更新图片URL
-                    img['src'] = images[0]['url']
-                    # 确保有alt属性
-                    if not img.get('alt'):
-                        img['alt'] = '图片'
-        return str(soup)
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        with self._processed_lock:
+            processed = self._processed_contents.get(key)
+            if processed is not None:
+                self._processed_contents.move_to_end(key)
+                return processed
+        
+        processed = self._process_content_images(content, uploaded or {})
+        with self._processed_lock:
+            self._processed_contents[key] = processed
+            self._processed_contents[hashlib.sha256(processed.encode('utf-8')).hexdigest()] = processed
+            while len(self._processed_contents) > PROCESSED_CONTENT_CACHE_SIZE:
+                self._processed_contents.popitem(last=False)
+        return processed
+    
+    def _process_content_images(self, content: str, uploaded: Dict[str, str]) -> str:
+        """上传内容中的网络图片并替换为百家号图片地址，只改动 img 的 src 和 alt"""
+        sources = [src for src in self.content_image_sources(content) if src not in uploaded]
+        
+        # 并发上传，图片格式由上传时的转码处理，相同地址只上传一次
+        results = self.upload_images(sources)
+        self.check_upload_results(results)
+        uploaded = {**uploaded, **{r['source']: r['url'] for r in results}}
+        
+        # 按偏移量替换图片URL，并确保有alt属性
+        return rewrite_images(content, uploaded.get, default_alt='图片')
+
+    @staticmethod
+    def content_image_sources(content: str) -> List[str]:
+        """文章内容中需要上传的网络图片地址，去重并保持顺序"""
+        return list(dict.fromkeys(src for src in image_sources(content) if src.startswith('http')))
 
     def publish_article(self, 
                        article_id: str,
@@ -295,33 +401,161 @@ class BaijiahaoPublisher:
             "article_id": article_id
         }
 
-        headers = {
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Origin': 'https://baijiahao.baidu.com',
-            'Referer': f'https://baijiahao.baidu.com/builder/rc/edit?type=news&article_id={article_id}',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36',
-            'Token': self.edit_token
-        }
+        def send(token: str) -> Dict[str, Any]:
+            headers = {
+                'Accept': 'application/json, text/plain, */*',
+                'Accept-Language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Origin': 'https://baijiahao.baidu.com',
+                'Referer': f'https://baijiahao.baidu.com/builder/rc/edit?type=news&article_id={article_id}',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36',
+                'Token': token
+            }
 
-        response = self.session.post(
-            url,
-            headers=headers,
-            cookies=self.main_cookies,
-            data=form_data,
-            params={'type': 'news', 'callback': 'bjhpublish'}
-        )
-        
-        return response.json()
+            response = self.session.post(
+                url,
+                headers=headers,
+                cookies=self.main_cookies,
+                data=form_data,
+                params={'type': 'news', 'callback': 'bjhpublish'}
+            )
+            
+            return response.json()
+        
+        return self._with_token(send)
             
         
+    def upload_images(self, image_sources: List[str]) -> List[Dict[str, str]]:
+        """并发上传一组图片
+        
+        文章正文图片和封面共用同一个有界线程池，单张失败不影响其他图片。
+        
+        Args:
+            image_sources: 图片来源列表，可以是本地文件路径或URL
+            
+        Returns:
+            与 image_sources 顺序一致的结果列表，成功时包含 source 和 url，失败时包含 source 和 error
+        """
+        if not image_sources:
+            return []
+        if len(image_sources) == 1:
+            return [self._upload_result(image_sources[0])]
+        return list(self._get_upload_pool().map(self._upload_result, image_sources))
+    
+    def submit_upload(self, image_source: str) -> Future:
+        """把一张图片提交到共享的上传线程池，不等待
+        
+        Args:
+            image_source: 图片来源，可以是本地文件路径或URL
+            
+        Returns:
+            结果与 upload_images 的单项相同的 Future
+        """
+        return self._get_upload_pool().submit(self._upload_result, image_source)
+    
+    def _upload_result(self, source: str) -> Dict[str, str]:
+        """上传一张图片，失败时返回错误而不抛出"""
+        try:
+            images = self.upload_image(source)
+        except Exception as e:
+            return {'source': source, 'error': str(e)}
+        if not images or not images[0].get('url'):
+            return {'source': source, 'error': '上传图片失败: 未返回图片地址'}
+        return {'source': source, 'url': images[0]['url']}
+    
+    @staticmethod
+    def check_upload_results(results: List[Dict[str, str]]) -> None:
+        """有图片上传失败时抛出异常，列出每张失败的图片"""
+        failures = [f"{r['source']}: {r['error']}" for r in results if 'error' in r]
+        if failures:
+            raise Exception(f'{len(failures)}张图片上传失败: ' + '; '.join(failures))
+    
+    def close(self) -> None:
+        """关闭上传线程池和会话，已提交的上传会继续完成"""
+        with self._upload_pool_lock:
+            pool, self._upload_pool = self._upload_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+        self.session.close()
+    
+    def _get_upload_pool(self) -> ThreadPoolExecutor:
+        with self._upload_pool_lock:
+            if self._upload_pool is None:
+                self._upload_pool = ThreadPoolExecutor(
+                    max_workers=UPLOAD_WORKERS, thread_name_prefix='bjh-upload')
+            return self._upload_pool
+        
     def upload_image(self, image_source: str) -> List[Dict[str, str]]:
         """上传图片
         
+        设置了上传缓存时，同一账号上传过的来源URL直接返回之前的地址，
+        内容相同的图片只下载不上传。
+        
+        Args:
+            image_source: 图片来源，可以是本地文件路径或URL
+            
+        Returns:
+            上传结果列表
+        """
+        cache = self.upload_cache if self.account else None
+        source = image_source if image_source.startswith('http') else None
+        if cache is not None and source:
+            url = cache.get(self.account, source=source)
+            if url:
+                return [{'url': url}]
+        
+        try:
+            image = self._open_image(image_source)
+        except Exception as e:
+            raise Exception(f'上传图片失败: {str(e)}')
+        
+        # 以原图内容作为缓存键，命中时也省去转码
+        sha256 = image.sha256
+        with image:
+            if cache is not None:
+                url = cache.get(self.account, sha256=sha256)
+                if url:
+                    cache.put(self.account, url, source=source)
+                    return [{'url': url}]
+            
+            try:
+                # 按真实格式整理，webp/gif/avif 等转为JPEG，超出限制的图片重新压缩
+                normalized = normalize_image(image, IMAGE_MAX_BYTES, IMAGE_MAX_SIDE)
+            except Exception as e:
+                raise Exception(f'上传图片失败: {str(e)}')
+            with normalized:
+                images = self._upload_image_file(normalized)
+        if cache is not None:
+            cache.put(self.account, images[0]['url'], source=source, sha256=sha256)
+        return images
+    
+    def _open_image(self, image_source: str) -> SpooledImage:
+        """读取图片内容，网络图片流式下载，较大的图片落到临时文件
+        
         Args:
             image_source: 图片来源，可以是本地文件路径或URL
             
+        Returns:
+            图片，MIME类型在上传前按文件内容修正
+        """
+        if image_source.startswith('http'):
+            # 如果是URL，下载图片
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            }
+            return download_image(image_source, headers=headers, timeout=10)
+        
+        # 如果是本地文件，绝对路径（如即梦工具转码后的本地图片）直接读取
+        if not os.path.isabs(image_source) and not image_source.startswith('images/'):
+            image_source = f'images/{image_source}'
+        return open_image(image_source, mimetypes.guess_type(image_source)[0] or 'image/jpeg')
+    
+    def _upload_image_file(self, image: SpooledImage) -> List[Dict[str, str]]:
+        """把图片上传到百家号，请求体从文件中分块读取
+        
+        Args:
+            image: 图片
+            
         Returns:
             上传结果列表
         """
@@ -337,31 +571,15 @@ class BaijiahaoPublisher:
                 'article_type': 'news'
             }
             
-            # 获取图片数据
-            if image_source.startswith('http'):
-                # 如果是URL，下载图片
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                img_response = requests.get(image_source, headers=headers, timeout=10)
-                img_response.raise_for_status()
-                image_data = img_response.content
-                content_type = img_response.headers.get('content-type', 'image/jpeg')
-            else:
-                # 如果是本地文件
-                if not image_source.startswith('images/'):
-                    image_source = f'images/{image_source}'
-                with open(image_source, 'rb') as f:
-                    image_data = f.read()
-                content_type = 'image/jpeg'  # 默认使用jpeg
-            
-            # 构建文件数据
-            files = {
-                'media': ('image.jpg', image_data, content_type)
-            }
+            # 构建流式的 multipart 请求体
+            body = MultipartEncoder(data, {
+                'media': ('image.png' if image.content_type == 'image/png' else 'image.jpg',
+                          image.file, image.content_type)
+            })
             
             # 添加上传请求头
             headers = {
+                'Content-Type': body.content_type,
                 'Accept': '*/*',
                 'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
                 'Origin': 'https://baijiahao.baidu.com',
@@ -373,8 +591,7 @@ class BaijiahaoPublisher:
             # 发送请求
             response = self.session.post(
                 'https://baijiahao.baidu.com/pcui/picture/uploadproxy',
-                files=files,
-                data=data,
+                data=body,
                 headers=headers
             )
             response.raise_for_status()
@@ -388,4 +605,42 @@ class BaijiahaoPublisher:
             }]
             
         except Exception as e:
-            raise Exception(f'上传图片失败: {str(e)}')
\ No newline at end of file
+            raise Exception(f'上传图片失败: {str(e)}')
+
+# cookies摘要 -> 发布器，按最近使用排序
+_publishers: "OrderedDict[str, BaijiahaoPublisher]" = OrderedDict()
+_publishers_lock = threading.Lock()
+
+def get_publisher(cookies: str) -> BaijiahaoPublisher:
+    """获取进程内共享的发布器，相同cookies复用同一个会话和token
+    
+    最多保留 MAX_PUBLISHERS 个发布器，空闲超过 PUBLISHER_IDLE_TTL 或超出数量时
+    淘汰最久未使用的，并关闭其会话和上传线程池。
+    
+    Args:
+        cookies: 完整的cookies字符串
+        
+    Returns:
+        已设置cookies的发布器
+    """
+    key = hashlib.sha256(cookies.strip().encode('utf-8')).hexdigest()
+    now = time.monotonic()
+    evicted = []
+    with _publishers_lock:
+        publisher = _publishers.pop(key, None)
+        while _publishers:
+            oldest = next(iter(_publishers.values()))
+            if len(_publishers) < MAX_PUBLISHERS and now - oldest.last_used <= PUBLISHER_IDLE_TTL:
+                break
+            evicted.append(_publishers.popitem(last=False)[1])
+        if publisher is None:
+            publisher = BaijiahaoPublisher(upload_cache=get_upload_cache())
+        publisher.last_used = now
+        _publishers[key] = publisher
+    for stale in evicted:
+        stale.close()
+    if publisher.main_cookies is None:
+        publisher.set_main_cookies(cookies.strip())
+    else:
+        publisher.ensure_token()
+    return publisher
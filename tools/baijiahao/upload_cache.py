@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 百家号图片地址长期有效，缓存有效期主要用于淘汰不再使用的条目
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+# 缓存键的类型
+KIND_SOURCE = 'source'
+KIND_SHA256 = 'sha256'
+
+class UploadCache:
+    """百家号图片上传缓存
+
+    按账号分别记录图片来源URL和图片内容SHA-256对应的百家号图片地址，基于SQLite持久化。
+    来源URL命中时既不下载也不上传；内容命中时只下载不上传。
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL):
+        """初始化
+
+        Args:
+            path: SQLite数据库文件路径，为空时使用 BAIJIAHAO_UPLOAD_CACHE_PATH 或系统临时目录
+            ttl: 缓存有效期（秒）
+        """
+        self.path = path or os.getenv('BAIJIAHAO_UPLOAD_CACHE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'baijiahao_upload_cache.sqlite3')
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS uploads ('
+            'account TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, '
+            'url TEXT NOT NULL, created_at REAL NOT NULL, '
+            'PRIMARY KEY (account, kind, key))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS uploads_created_at ON uploads (created_at)')
+        self._conn.commit()
+
+    def get(self, account: str, source: Optional[str] = None, sha256: Optional[str] = None) -> Optional[str]:
+        """查询已上传的图片地址
+
+        Args:
+            account: 账号指纹
+            source: 图片来源URL
+            sha256: 图片内容的SHA-256
+
+        Returns:
+            百家号图片地址，未命中或已过期时返回None
+        """
+        kind, key = (KIND_SOURCE, source) if source else (KIND_SHA256, sha256)
+        if not key:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, created_at FROM uploads WHERE account = ? AND kind = ? AND key = ?',
+                (account, kind, key),
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute(
+                        'DELETE FROM uploads WHERE account = ? AND kind = ? AND key = ?', (account, kind, key))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, account: str, url: str, source: Optional[str] = None, sha256: Optional[str] = None) -> None:
+        """记录上传结果
+
+        Args:
+            account: 账号指纹
+            url: 百家号图片地址
+            source: 图片来源URL，本地文件不记录
+            sha256: 图片内容的SHA-256
+        """
+        now = time.time()
+        rows = [(account, kind, key, url, now) for kind, key in ((KIND_SOURCE, source), (KIND_SHA256, sha256)) if key]
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)', rows)
+            self._conn.execute('DELETE FROM uploads WHERE created_at < ?', (now - self.ttl,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计
+
+        Returns:
+            包含 hits、misses、hit_rate、size 的字典
+        """
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM uploads').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': size,
+        }
+
+    def clear(self, account: Optional[str] = None) -> None:
+        """清空缓存
+
+        Args:
+            account: 账号指纹，为空时清空所有账号
+        """
+        with self._lock:
+            if account:
+                self._conn.execute('DELETE FROM uploads WHERE account = ?', (account,))
+            else:
+                self._conn.execute('DELETE FROM uploads')
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+_default_cache: Optional[UploadCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_upload_cache() -> UploadCache:
+    """获取进程内共享的上传缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = UploadCache()
+        return _default_cache
@@ -0,0 +1,137 @@
+import html
+import re
+from html.parser import HTMLParser
+from typing import Callable, List, Optional, Tuple
+
+# 标签内的单个属性：名称及可选的值（双引号、单引号或不带引号）
+ATTR_RE = re.compile(r'''[\s/]*([^\s/>=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]*))?''')
+
+class ImageTag:
+    """文档中的一个 <img> 标签"""
+
+    def __init__(
+        self,
+        start: int,
+        end: int,
+        src: Optional[str],
+        src_span: Optional[Tuple[int, int]],
+        alt: Optional[str],
+        alt_span: Optional[Tuple[int, int]],
+    ):
+        # 标签在文档中的起止位置
+        self.start = start
+        self.end = end
+        # 反转义后的属性值，以及属性值（含引号，无值时为空区间）在文档中的位置
+        self.src = src
+        self.src_span = src_span
+        self.alt = alt
+        self.alt_span = alt_span
+
+class _ImageScanner(HTMLParser):
+    """用 html.parser 的事件定位 <img> 标签，script/style 内的文本不会被误认"""
+
+    def __init__(self, content: str):
+        super().__init__(convert_charrefs=True)
+        self.images: List[ImageTag] = []
+        self._line_starts = [0]
+        for match in re.finditer('\n', content):
+            self._line_starts.append(match.end())
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            self._record()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'img':
+            self._record()
+
+    def _record(self) -> None:
+        line, column = self.getpos()
+        start = self._line_starts[line - 1] + column
+        raw = self.get_starttag_text()
+        found = {}
+        # 跳过标签名
+        position = 4
+        while True:
+            match = ATTR_RE.match(raw, position)
+            if not match or match.end() == position:
+                break
+            position = match.end()
+            name = match.group(1).lower()
+            if name not in ('src', 'alt') or name in found:
+                continue
+            value = match.group(2)
+            if value is None:
+                # 没有值的属性，记录为属性名之后的空区间
+                found[name] = ('', (start + match.end(1), start + match.end(1)))
+                continue
+            quoted = value[:1] in ('"', "'")
+            text = html.unescape(value[1:-1] if quoted else value)
+            found[name] = (text, (start + match.start(2), start + match.end(2)))
+        src, src_span = found.get('src', (None, None))
+        alt, alt_span = found.get('alt', (None, None))
+        self.images.append(ImageTag(start, start + len(raw), src, src_span, alt, alt_span))
+
+def find_images(content: str) -> List[ImageTag]:
+    """查找文档中所有 <img> 标签
+
+    Args:
+        content: HTML文本
+
+    Returns:
+        按出现顺序排列的图片标签
+    """
+    scanner = _ImageScanner(content)
+    scanner.feed(content)
+    scanner.close()
+    return scanner.images
+
+def image_sources(content: str) -> List[str]:
+    """文档中所有图片的 src，按出现顺序"""
+    return [image.src for image in find_images(content) if image.src]
+
+def rewrite_images(
+    content: str,
+    replace: Callable[[str], Optional[str]],
+    default_alt: Optional[str] = None,
+) -> str:
+    """按偏移量替换 <img> 的 src，其余内容逐字节保留
+
+    Args:
+        content: HTML文本
+        replace: 以原 src 为参数，返回新地址；返回None时保持该标签不变
+        default_alt: 替换了 src 且没有 alt（或 alt 为空）时补上的 alt
+
+    Returns:
+        替换后的HTML文本
+    """
+    # (起始位置, 结束位置, 替换文本)
+    edits: List[Tuple[int, int, str]] = []
+    for image in find_images(content):
+        if not image.src:
+            continue
+        new_src = replace(image.src)
+        if new_src is None:
+            continue
+        edits.append((*image.src_span, f'"{html.escape(new_src)}"'))
+        if default_alt and not image.alt:
+            alt_value = f'"{html.escape(default_alt)}"'
+            if image.alt_span is None:
+                # 插入到标签结尾的 > 或 /> 之前
+                tag_end = image.end - (2 if content[image.end - 2:image.end] == '/>' else 1)
+                while tag_end > image.start and content[tag_end - 1].isspace():
+                    tag_end -= 1
+                edits.append((tag_end, tag_end, f' alt={alt_value}'))
+            elif image.alt_span[0] == image.alt_span[1]:
+                edits.append((*image.alt_span, f'={alt_value}'))
+            else:
+                edits.append((*image.alt_span, alt_value))
+    
+    pieces: List[str] = []
+    position = 0
+    for start, end, text in sorted(edits):
+        pieces.append(content[position:start])
+        pieces.append(text)
+        position = end
+    pieces.append(content[position:])
+    return ''.join(pieces)
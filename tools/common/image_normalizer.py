@@ -0,0 +1,154 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Sequence
+
+from PIL import Image
+
+from tools.common.multipart import SpooledImage, spool_chunks
+
+# 各图片格式的MIME类型
+FORMAT_MIME = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+    'bmp': 'image/bmp',
+}
+# 无需转码即可上传的格式
+PASSTHROUGH_FORMATS = ('jpeg', 'png')
+# 转码时依次尝试的JPEG质量
+JPEG_QUALITIES = (90, 82, 74, 66, 58, 50)
+# 压到最低质量仍超出大小限制时，每轮缩小的比例
+SHRINK_FACTOR = 0.75
+# 转码进程数，为0时在调用线程中转码
+TRANSCODE_WORKERS = int(os.getenv('IMAGE_TRANSCODE_WORKERS', min(4, os.cpu_count() or 1)))
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """根据文件头判断图片的真实格式
+
+    Args:
+        head: 文件开头的至少16个字节
+
+    Returns:
+        格式名（见 FORMAT_MIME），无法识别时返回None
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'avif'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    return None
+
+def _transcode(data: bytes, max_bytes: int, max_side: int) -> bytes:
+    """解码图片并重新编码为不超过大小限制的JPEG（在转码进程中执行）"""
+    # AVIF 由 Pillow 11.3 起的官方wheel直接解码
+    with Image.open(io.BytesIO(data)) as image:
+        # 动图只取第一帧
+        image.seek(0)
+        image.load()
+        if image.mode in ('RGBA', 'LA', 'P', 'PA'):
+            # JPEG不支持透明通道，铺白底
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    while True:
+        for quality in JPEG_QUALITIES:
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            if output.tell() <= max_bytes:
+                return output.getvalue()
+        width, height = image.size
+        if max(width, height) <= 64:
+            return output.getvalue()
+        image = image.resize((max(1, int(width * SHRINK_FACTOR)), max(1, int(height * SHRINK_FACTOR))), Image.LANCZOS)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _run_transcode(data: bytes, max_bytes: int, max_side: int) -> bytes:
+    """在进程池中转码，进程池崩溃时换一个新进程池，并在当前线程中完成这一张
+
+    转码本身的错误（如图片损坏无法解码）直接抛出，不影响进程池。
+    """
+    global _pool
+    if TRANSCODE_WORKERS > 0:
+        with _pool_lock:
+            if _pool is None:
+                # 进程内有上传线程和即梦事件循环线程，fork 出的子进程可能继承被持有的锁，使用 spawn
+                _pool = ProcessPoolExecutor(
+                    max_workers=TRANSCODE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            pool = _pool
+        try:
+            return pool.submit(_transcode, data, max_bytes, max_side).result()
+        except BrokenProcessPool:
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            pool.shutdown(wait=False)
+    return _transcode(data, max_bytes, max_side)
+
+def normalize_image(
+    image: SpooledImage,
+    max_bytes: int,
+    max_side: int,
+    passthrough: Sequence[str] = PASSTHROUGH_FORMATS,
+) -> SpooledImage:
+    """把图片整理为平台可接受的格式和大小
+
+    按文件头识别真实格式：格式可直接上传且大小、尺寸都在限制内时原样返回（修正MIME类型），
+    否则在进程池中解码、缩放并重新编码为JPEG。
+
+    Args:
+        image: 原图，转码时会被关闭
+        max_bytes: 文件大小上限（字节）
+        max_side: 最长边像素上限
+        passthrough: 可以直接上传的格式
+
+    Returns:
+        整理后的图片，读取位置在开头
+
+    Raises:
+        Exception: 无法识别或无法解码的图片
+    """
+    start = image.file.tell()
+    head = image.file.read(16)
+    image.file.seek(start)
+    fmt = sniff_format(head)
+    if fmt is None:
+        raise Exception('无法识别的图片格式')
+
+    if fmt in passthrough and image.size <= max_bytes:
+        # 只读取文件头获取尺寸，不解码像素
+        with Image.open(image.file) as probe:
+            size = probe.size
+        image.file.seek(start)
+        if max(size) <= max_side:
+            image.content_type = FORMAT_MIME[fmt]
+            return image
+
+    data = image.file.read()
+    try:
+        output = _run_transcode(data, max_bytes, max_side)
+    except Exception as e:
+        raise Exception(f'图片转码失败（{fmt}）: {str(e)}')
+    image.close()
+    return spool_chunks([output], FORMAT_MIME['jpeg'])
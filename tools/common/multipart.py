@@ -0,0 +1,172 @@
+import hashlib
+import os
+import uuid
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+# 超过该大小的图片落到临时文件，否则留在内存中
+SPOOL_THRESHOLD = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+class SpooledImage:
+    """已下载（或已打开）的图片
+
+    数据保存在 SpooledTemporaryFile 或本地文件中，同时记录大小和SHA-256，
+    上传时由 MultipartEncoder 分块读取，不需要整张图片常驻内存。
+    """
+
+    def __init__(self, file: BinaryIO, size: int, sha256: str, content_type: str):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'SpooledImage':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def spool_chunks(
+    chunks: Iterable[bytes],
+    content_type: str,
+    threshold: int = SPOOL_THRESHOLD,
+) -> SpooledImage:
+    """把数据块写入临时文件并计算SHA-256
+
+    Args:
+        chunks: 数据块
+        content_type: MIME类型
+        threshold: 超过该大小时落到磁盘
+
+    Returns:
+        读取位置在开头的图片
+    """
+    digest = hashlib.sha256()
+    file = SpooledTemporaryFile(max_size=threshold)
+    size = 0
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            file.write(chunk)
+            size += len(chunk)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return SpooledImage(file, size, digest.hexdigest(), content_type)
+
+def download_image(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    session: Optional[requests.Session] = None,
+    threshold: int = SPOOL_THRESHOLD,
+) -> SpooledImage:
+    """流式下载图片
+
+    Args:
+        url: 图片地址
+        headers: 请求头
+        timeout: 超时时间（秒）
+        session: 复用的会话，为空时直接使用 requests
+        threshold: 超过该大小时落到磁盘
+
+    Returns:
+        下载后的图片
+    """
+    with (session or requests).get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        return spool_chunks(
+            response.iter_content(CHUNK_SIZE),
+            response.headers.get('content-type', 'image/jpeg'),
+            threshold,
+        )
+
+def open_image(path: str, content_type: str) -> SpooledImage:
+    """打开本地图片文件并计算SHA-256
+
+    Args:
+        path: 文件路径
+        content_type: MIME类型
+
+    Returns:
+        读取位置在开头的图片
+    """
+    file = open(path, 'rb')
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return SpooledImage(file, os.fstat(file.fileno()).st_size, digest.hexdigest(), content_type)
+
+class MultipartEncoder:
+    """流式的 multipart/form-data 请求体
+
+    作为 requests 的 data 参数使用：实现了 __len__，requests 会据此设置 Content-Length，
+    再通过 __iter__ 分块发送，文件内容按块从文件对象中读取。可重复迭代（如重定向重发）。
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Tuple[str, BinaryIO, str]]] = None,
+        boundary: Optional[str] = None,
+    ):
+        """初始化
+
+        Args:
+            fields: 普通表单字段
+            files: 文件字段，值为 (文件名, 文件对象, MIME类型)，从文件对象的当前位置读到末尾
+            boundary: 分隔符，为空时随机生成
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        # (分段头, 文件对象, 文件起始位置, 文件长度)
+        self._parts: List[Tuple[bytes, Optional[BinaryIO], int, int]] = []
+        for name, value in (fields or {}).items():
+            self._parts.append((
+                self._header(name) + b'\r\n' + str(value).encode('utf-8') + b'\r\n', None, 0, 0))
+        for name, (filename, fileobj, content_type) in (files or {}).items():
+            start = fileobj.tell()
+            size = fileobj.seek(0, os.SEEK_END) - start
+            fileobj.seek(start)
+            header = self._header(name, filename) + f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8')
+            self._parts.append((header, fileobj, start, size))
+        self._tail = f'--{self.boundary}--\r\n'.encode('ascii')
+
+    def _header(self, name: str, filename: Optional[str] = None) -> bytes:
+        disposition = f'form-data; name="{_quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{_quote(filename)}"'
+        return f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'.encode('utf-8')
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return sum(len(header) + size + (2 if fileobj else 0) for header, fileobj, _, size in self._parts) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for header, fileobj, start, size in self._parts:
+            yield header
+            if fileobj is None:
+                continue
+            fileobj.seek(start)
+            remaining = size
+            while remaining > 0:
+                chunk = fileobj.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError('文件在上传过程中被截断')
+                remaining -= len(chunk)
+                yield chunk
+            yield b'\r\n'
+        yield self._tail
+
+def _quote(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
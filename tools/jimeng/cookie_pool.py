@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 积分不足的账号暂停使用的时间（秒），之后重新尝试
+EXHAUSTED_COOLDOWN = 60 * 60
+# 被限流的账号暂停使用的时间（秒）
+THROTTLED_COOLDOWN = 30
+# 进程内最多保留的账号池数，超出时淘汰最久未使用的
+MAX_POOLS = 16
+# 账号池空闲超过该时间（秒）后淘汰
+POOL_IDLE_TTL = 30 * 60
+
+def fingerprint(cookie: str) -> str:
+    """cookie的短指纹，用于标识账号而不暴露cookie内容"""
+    return hashlib.sha256(cookie.encode('utf-8')).hexdigest()[:12]
+
+class Account:
+    """账号池中的单个即梦账号"""
+
+    def __init__(self, cookie: str):
+        self.cookie = cookie
+        self.fingerprint = fingerprint(cookie)
+        self.in_flight = 0
+        # 剩余积分，未知时为None
+        self.points: Optional[int] = None
+        self.unavailable_until = 0.0
+
+    def available(self, now: float) -> bool:
+        """账号当前是否可用"""
+        return now >= self.unavailable_until and (self.points is None or self.points > 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'account': self.fingerprint,
+            'in_flight': self.in_flight,
+            'points': self.points,
+            'unavailable_for': max(0.0, self.unavailable_until - time.monotonic()),
+        }
+
+class CookiePool:
+    """即梦多账号池
+
+    记录每个账号进行中的生成数和剩余积分，把提交分配给仍有积分且负载最低的账号；
+    积分不足或被限流的账号会暂停使用一段时间。
+    """
+
+    def __init__(
+        self,
+        cookies: Iterable[str],
+        cost: int = 1,
+        exhausted_cooldown: float = EXHAUSTED_COOLDOWN,
+        throttled_cooldown: float = THROTTLED_COOLDOWN,
+    ):
+        """初始化
+
+        Args:
+            cookies: 各账号的cookie
+            cost: 每次生成预估消耗的积分
+            exhausted_cooldown: 积分不足的账号暂停使用的时间（秒）
+            throttled_cooldown: 被限流的账号暂停使用的时间（秒）
+        """
+        self.accounts: List[Account] = [Account(c) for c in dict.fromkeys(c.strip() for c in cookies) if c]
+        if not self.accounts:
+            raise ValueError('账号池至少需要一个cookie')
+        self.cost = cost
+        self.exhausted_cooldown = exhausted_cooldown
+        self.throttled_cooldown = throttled_cooldown
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude: Iterable[Account] = ()) -> Optional[Account]:
+        """选择一个账号并占用一个并发名额
+
+        Args:
+            exclude: 本次不再尝试的账号
+
+        Returns:
+            选中的账号，没有可用账号时返回None
+        """
+        now = time.monotonic()
+        excluded = set(id(a) for a in exclude)
+        with self._lock:
+            for a in self.accounts:
+                # 积分不足的账号冷却结束后把积分恢复为未知，重新尝试
+                if a.points == 0 and a.unavailable_until and now >= a.unavailable_until:
+                    a.points = None
+                    a.unavailable_until = 0.0
+            candidates = [a for a in self.accounts if id(a) not in excluded and a.available(now)]
+            if not candidates:
+                return None
+            account = min(candidates, key=lambda a: (a.in_flight, -(a.points or 0)))
+            account.in_flight += 1
+            return account
+
+    def release(self, account: Account, spent: bool = False) -> None:
+        """释放账号的并发名额
+
+        Args:
+            account: 账号
+            spent: 是否已成功提交并消耗积分
+        """
+        with self._lock:
+            account.in_flight = max(0, account.in_flight - 1)
+            if spent and account.points is not None:
+                account.points = max(0, account.points - self.cost)
+
+    def mark_exhausted(self, account: Account) -> None:
+        """标记账号积分不足"""
+        with self._lock:
+            account.points = 0
+            account.unavailable_until = time.monotonic() + self.exhausted_cooldown
+
+    def mark_throttled(self, account: Account) -> None:
+        """标记账号被限流"""
+        with self._lock:
+            account.unavailable_until = time.monotonic() + self.throttled_cooldown
+
+    def update_points(self, account: Account, points: int) -> None:
+        """更新账号的剩余积分"""
+        with self._lock:
+            account.points = points
+            account.unavailable_until = 0.0
+
+    def status(self) -> List[Dict[str, Any]]:
+        """各账号的当前状态"""
+        with self._lock:
+            return [a.to_dict() for a in self.accounts]
+
+# cookie集合 -> 账号池，按最近使用排序
+_pools: "OrderedDict[Tuple[str, ...], CookiePool]" = OrderedDict()
+_pools_lock = threading.Lock()
+
+def parse_cookies(value: str) -> List[str]:
+    """解析多账号cookie，每行一个账号"""
+    return [line.strip() for line in (value or '').splitlines() if line.strip()]
+
+def get_cookie_pool(cookies: Iterable[str]) -> CookiePool:
+    """获取进程内共享的账号池，相同的cookie集合复用同一个池
+
+    最多保留 MAX_POOLS 个账号池，空闲超过 POOL_IDLE_TTL 或超出数量时淘汰最久未使用的，
+    不再长期持有已轮换的cookie。
+
+    Args:
+        cookies: 各账号的cookie
+
+    Returns:
+        账号池
+    """
+    key = tuple(sorted(set(c.strip() for c in cookies if c.strip())))
+    now = time.monotonic()
+    with _pools_lock:
+        pool = _pools.pop(key, None)
+        while _pools:
+            oldest = next(iter(_pools.values()))
+            if len(_pools) < MAX_POOLS and now - oldest.last_used <= POOL_IDLE_TTL:
+                break
+            _pools.popitem(last=False)
+        if pool is None:
+            pool = CookiePool(key)
+        pool.last_used = now
+        _pools[key] = pool
+        return pool
@@ -0,0 +1,71 @@
+from collections.abc import Generator
+from typing import Any
+import json
+import re
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from tools.jimeng.jimeng_generator import fetch_generations, run_sync
+from tools.jimeng.cookie_pool import get_cookie_pool, parse_cookies
+from tools.jimeng.job_journal import get_job_journal
+
+class JimengFetchTool(Tool):
+    """即梦生成结果查询工具
+
+    对一组记录ID做一次批量状态查询，不等待；未完成的任务返回 pending 标记，
+    工作流可以稍后再次查询。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        cookie = tool_parameters.get('cookie', '')
+        history_ids = self._parse_ids(tool_parameters.get('history_ids'))
+
+        try:
+            if not history_ids:
+                raise Exception('请提供至少一个记录ID')
+
+            # 多个cookie（每行一个）时按任务日志中记录的提交账号查询
+            cookies = parse_cookies(cookie)
+            if len(cookies) > 1:
+                cookie = get_cookie_pool(cookies)
+
+            results = run_sync(fetch_generations(cookie, history_ids, journal=get_job_journal()))
+            pending = [history_id for history_id, r in results.items() if r['status'] == 'pending']
+            # 本次查询失败的记录状态未知，需要重新查询而不是重新提交
+            errors = [history_id for history_id, r in results.items() if r['status'] == 'error']
+
+            yield ToolInvokeMessage(
+                type="json",
+                message={
+                    "json_object": {
+                        "pending": pending,
+                        "errors": errors,
+                        "done": not pending and not errors,
+                        "results": results
+                    }
+                }
+            )
+
+        except Exception as e:
+            yield ToolInvokeMessage(
+                type="text",
+                message={
+                    "text": f"查询失败：{str(e)}"
+                }
+            )
+            raise e
+
+    @staticmethod
+    def _parse_ids(value: Any) -> list[str]:
+        """解析记录ID，支持JSON数组或以逗号、换行分隔"""
+        if not value:
+            return []
+        value = str(value).strip()
+        if value.startswith('['):
+            try:
+                return [str(i).strip() for i in json.loads(value) if str(i).strip()]
+            except json.JSONDecodeError:
+                raise Exception('记录ID格式错误，应为JSON数组或以逗号、换行分隔')
+        return [i.strip() for i in re.split(r'[,，\s]+', value) if i.strip()]
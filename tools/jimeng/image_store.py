@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+from PIL import Image
+
+from tools.jimeng.jimeng_generator import get_client
+
+# 支持的输出格式及对应的MIME类型
+OUTPUT_FORMATS = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+JPEG_QUALITY = 90
+CHUNK_SIZE = 64 * 1024
+# 存储目录中文件的保留时间（秒）和总大小上限（字节），超出时按最近使用时间淘汰
+DEFAULT_MAX_AGE = 24 * 60 * 60
+DEFAULT_MAX_BYTES = int(os.getenv('JIMENG_IMAGE_MAX_BYTES', 1024 * 1024 * 1024))
+# 自动淘汰的最小间隔（秒）
+EVICT_INTERVAL = 10 * 60
+
+class ImageStore:
+    """内容寻址的本地图片存储
+
+    生成结果的远程图片只下载一次，按内容SHA-256存放，
+    再按需转码为指定格式和尺寸，返回可供发布工具直接使用的本地文件信息。
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """初始化
+
+        Args:
+            root: 存储目录，为空时使用 JIMENG_IMAGE_DIR 或系统临时目录
+            max_age: 文件的保留时间（秒）
+            max_bytes: 存储目录的总大小上限（字节）
+        """
+        self.root = root or os.getenv('JIMENG_IMAGE_DIR') or os.path.join(
+            tempfile.gettempdir(), 'jimeng_images')
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._evicted_at = 0.0
+        self._evict_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        directory = os.path.join(self.root, name[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    async def fetch(self, url: str, client: Optional[httpx.AsyncClient] = None) -> str:
+        """流式下载图片到本地存储
+
+        Args:
+            url: 图片地址
+            client: HTTP客户端，为空时使用共享客户端
+
+        Returns:
+            图片内容的SHA-256
+        """
+        client = client or get_client()
+        digest = hashlib.sha256()
+        temp_path = os.path.join(self.root, f".{uuid.uuid4().hex}.part")
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                with open(temp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        digest.update(chunk)
+                        f.write(chunk)
+            sha256 = digest.hexdigest()
+            os.replace(temp_path, self._path(sha256))
+            return sha256
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def transcode(self, sha256: str, fmt: str = "jpeg", max_size: Optional[int] = None) -> Dict[str, Any]:
+        """把已下载的图片转码为指定格式，结果按参数缓存在存储目录中
+
+        Args:
+            sha256: 原图内容的SHA-256
+            fmt: 输出格式，jpeg 或 png
+            max_size: 最长边像素上限，为空时保持原尺寸
+
+        Returns:
+            本地图片信息
+        """
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        suffix = "jpg" if fmt == "jpeg" else fmt
+        target = self._path(f"{sha256}-{max_size or 0}.{suffix}")
+
+        if os.path.exists(target):
+            # 刷新修改时间，避免刚被使用的文件被淘汰
+            os.utime(target)
+        else:
+            with Image.open(self._path(sha256)) as image:
+                image.load()
+                if max_size and max(image.size) > max_size:
+                    image.thumbnail((max_size, max_size), Image.LANCZOS)
+                if fmt == "jpeg" and image.mode != "RGB":
+                    # JPEG不支持透明通道，铺白底
+                    rgba = image.convert("RGBA")
+                    image = Image.new("RGB", rgba.size, (255, 255, 255))
+                    image.paste(rgba, mask=rgba.getchannel("A"))
+                temp_path = f"{target}.{uuid.uuid4().hex}.part"
+                if fmt == "jpeg":
+                    image.save(temp_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+                else:
+                    image.save(temp_path, "PNG", optimize=True)
+                os.replace(temp_path, target)
+
+        with Image.open(target) as image:
+            width, height = image.size
+        return {
+            "path": target,
+            "sha256": sha256,
+            "format": fmt,
+            "mime_type": OUTPUT_FORMATS[fmt],
+            "width": width,
+            "height": height,
+            "bytes": os.path.getsize(target),
+        }
+
+    async def materialize(
+        self,
+        urls: List[str],
+        fmt: str = "jpeg",
+        max_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """下载并转码一组生成结果
+
+        Args:
+            urls: 图片地址列表
+            fmt: 输出格式，jpeg 或 png
+            max_size: 最长边像素上限
+
+        Returns:
+            与 urls 顺序一致的本地图片信息列表，每项额外包含来源 url
+        """
+        loop = asyncio.get_running_loop()
+
+        async def one(url: str) -> Dict[str, Any]:
+            sha256 = await self.fetch(url)
+            # 解码和缩放是CPU密集操作，放到线程池中执行
+            handle = await loop.run_in_executor(None, self.transcode, sha256, fmt, max_size)
+            handle["url"] = url
+            return handle
+
+        handles = list(await asyncio.gather(*(one(url) for url in urls if url)))
+        if time.monotonic() - self._evicted_at >= EVICT_INTERVAL:
+            await loop.run_in_executor(None, self.evict)
+        return handles
+
+    def evict(self) -> int:
+        """删除超过保留时间的文件，总大小仍超出上限时按修改时间从旧到新继续删除
+
+        Returns:
+            删除的文件数
+        """
+        with self._evict_lock:
+            self._evicted_at = time.monotonic()
+            files = []
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+            files.sort()
+
+            now = time.time()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for mtime, size, path in files:
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+_default_store: Optional[ImageStore] = None
+_default_store_lock = threading.Lock()
+
+def get_image_store() -> ImageStore:
+    """获取进程内共享的图片存储"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ImageStore()
+        return _default_store
@@ -1,14 +1,37 @@
 from collections.abc import Generator
 from typing import Any
-import asyncio
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from tools.jimeng.jimeng_generator import generate_image
+from tools.jimeng.jimeng_generator import (
+    DEFAULT_BATCH_CONCURRENCY,
+    generate_image,
+    generate_images,
+    iterate_sync,
+    parse_prompts,
+    refresh_pool_points,
+    resume_generation,
+    run_sync,
+    stream_generation,
+)
+from tools.jimeng.cookie_pool import get_cookie_pool, parse_cookies
+from tools.jimeng.rate_limiter import configure_rate_limits
+from tools.jimeng.image_store import get_image_store
+from tools.jimeng.job_journal import get_job_journal
+from tools.jimeng.result_cache import get_result_cache
+
+# 同步等待的兜底超时在生成超时之外额外预留的时间（秒），覆盖提交、限流排队等耗时
+SYNC_TIMEOUT_MARGIN = 60
+
+# 进度事件对应的提示文本
+PROGRESS_TEXT = {
+    'submitted': '已提交生成任务，记录ID：{history_id}',
+    'generating': '图片生成中...',
+}
 
 class JimengTool(Tool):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取参数
         cookie = tool_parameters.get('cookie', '')
@@ -18,28 +41,142 @@ class JimengTool(Tool):
         width = int(tool_parameters.get('width', 1024))
         height = int(tool_parameters.get('height', 1024))
         sample_strength = float(tool_parameters.get('sample_strength', 0.75))
-        
+        timeout = float(tool_parameters.get('timeout') or 110)
+        stream = tool_parameters.get('stream', '0') == '1'
+        seed = tool_parameters.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
+        use_cache = tool_parameters.get('use_cache', '0') == '1'
+        use_journal = tool_parameters.get('use_journal', '0') == '1'
+        history_id = tool_parameters.get('history_id')
+
+        # 下载转码参数
+        output_format = tool_parameters.get('output_format') or 'none'
+        max_size = tool_parameters.get('max_size')
+        max_size = int(max_size) if max_size else None
+        materialize = None
+        if output_format != 'none':
+            materialize = lambda urls: run_sync(get_image_store().materialize(urls, output_format, max_size))
+
+        # 批量生成参数
+        prompts = parse_prompts(tool_parameters.get('prompts'))
+        count = int(tool_parameters.get('count') or 1)
+        concurrency = int(tool_parameters.get('concurrency') or DEFAULT_BATCH_CONCURRENCY)
+
+        # 限流配置，对进程内所有即梦请求生效
+        rates = {}
+        if tool_parameters.get('rate_limit_generate'):
+            rates['generate'] = float(tool_parameters['rate_limit_generate'])
+        if tool_parameters.get('rate_limit_poll'):
+            rates['history'] = float(tool_parameters['rate_limit_poll'])
+        max_concurrency = tool_parameters.get('max_concurrency')
+        configure_rate_limits(rates, int(max_concurrency) if max_concurrency else None)
+
         try:
-            # 使用 asyncio.run 运行异步函数
-            result = asyncio.run(generate_image(
+            # 多个cookie（每行一个）时使用账号池，按积分和负载分配账号
+            cookies = parse_cookies(cookie)
+            if len(cookies) > 1:
+                cookie = get_cookie_pool(cookies)
+                if all(account.points is None for account in cookie.accounts):
+                    run_sync(refresh_pool_points(cookie))
+
+            if history_id:
+                # 接续之前提交的任务，不重新提交
+                result = run_sync(resume_generation(
+                    cookie,
+                    history_id,
+                    journal=get_job_journal(),
+                    timeout=timeout
+                ), timeout=timeout + SYNC_TIMEOUT_MARGIN)
+                yield ToolInvokeMessage(
+                    type="json",
+                    message={
+                        "json_object": {
+                            "history_id": history_id,
+                            "urls": result
+                        }
+                    }
+                )
+                return
+
+            if prompts or count > 1:
+                # 批量模式：每完成一个草稿就返回一条消息
+                results = iterate_sync(generate_images(
+                    cookie=cookie,
+                    prompts=prompts or [prompt],
+                    count=count,
+                    model=model,
+                    negative_prompt=negative_prompt,
+                    width=width,
+                    height=height,
+                    sample_strength=sample_strength,
+                    timeout=timeout,
+                    concurrency=concurrency
+                ), timeout=timeout + SYNC_TIMEOUT_MARGIN)
+                for item in results:
+                    if item.get('error'):
+                        yield ToolInvokeMessage(
+                            type="text",
+                            message={
+                                "text": f"第{item['index'] + 1}张生成失败：{item['error']}"
+                            }
+                        )
+                        continue
+                    if materialize:
+                        item['images'] = materialize(item['urls'])
+                    yield ToolInvokeMessage(
+                        type="json",
+                        message={
+                            "json_object": item
+                        }
+                    )
+                return
+
+            if stream:
+                # 流式模式：边等待边返回进度，每完成一张图片返回一条消息
+                events = iterate_sync(stream_generation(
+                    cookie=cookie,
+                    prompt=prompt,
+                    model=model,
+                    negative_prompt=negative_prompt,
+                    width=width,
+                    height=height,
+                    sample_strength=sample_strength,
+                    timeout=timeout,
+                    seed=seed
+                ), timeout=timeout + SYNC_TIMEOUT_MARGIN)
+                for event in events:
+                    if materialize and event['event'] == 'completed':
+                        event['images'] = materialize(event['urls'])
+                    yield self._event_message(event)
+                return
+
+            # 在共享的后台事件循环中运行，复用连接池
+            result = run_sync(generate_image(
                 cookie=cookie,
                 prompt=prompt,
                 model=model,
                 negative_prompt=negative_prompt,
                 width=width,
                 height=height,
-                sample_strength=sample_strength
-            ))
-            
+                sample_strength=sample_strength,
+                timeout=timeout,
+                seed=seed,
+                cache=get_result_cache() if use_cache else None,
+                journal=get_job_journal() if use_journal else None
+            ), timeout=timeout + SYNC_TIMEOUT_MARGIN)
+
+            output = {"urls": result}
+            if use_cache:
+                output["cache"] = get_result_cache().stats()
+            if materialize:
+                output["images"] = materialize(result)
             yield ToolInvokeMessage(
                 type="json",
                 message={
-                    "json_object": {
-                        "urls": result
-                    }
+                    "json_object": output
                 }
             )
-            
+
         except Exception as e:
             yield ToolInvokeMessage(
                 type="text",
@@ -47,4 +184,38 @@ class JimengTool(Tool):
                     "text": f"生成失败：{str(e)}"
                 }
             )
-            raise e 
\ No newline at end of file
+            raise e
+
+    @staticmethod
+    def _event_message(event: dict[str, Any]) -> ToolInvokeMessage:
+        """把进度事件转换为工具消息"""
+        if event['event'] == 'queued':
+            return ToolInvokeMessage(
+                type="text",
+                message={
+                    "text": f"排队中，当前位置：{event['queue_position']}"
+                }
+            )
+        if event['event'] in PROGRESS_TEXT:
+            return ToolInvokeMessage(
+                type="text",
+                message={
+                    "text": PROGRESS_TEXT[event['event']].format(**event)
+                }
+            )
+        if event['event'] == 'completed':
+            output = {"urls": event['urls']}
+            if 'images' in event:
+                output['images'] = event['images']
+            return ToolInvokeMessage(
+                type="json",
+                message={
+                    "json_object": output
+                }
+            )
+        return ToolInvokeMessage(
+            type="json",
+            message={
+                "json_object": event
+            }
+        )
@@ -1,11 +1,23 @@
+import functools
 import json
+import os
 import time
 import uuid
 import hashlib
 import random
-from typing import Optional, Dict, Any, Literal, List
-import requests
+import threading
+import weakref
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Literal, List, Coroutine, TypeVar, AsyncIterator, Iterator, Callable, Mapping, Tuple, Union
+import httpx
 import asyncio
+from tools.jimeng.cookie_pool import Account, CookiePool, fingerprint
+from tools.jimeng.job_journal import JobJournal, STATE_FAILED, STATE_SUCCEEDED, get_job_journal
+from tools.jimeng.json_template import JsonTemplate, placeholder
+from tools.jimeng.metrics import POLL_BUCKETS, get_metrics
+from tools.jimeng.poll_scheduler import PollScheduler
+from tools.jimeng.rate_limiter import get_rate_limiter
+from tools.jimeng.result_cache import ResultCache
 
 # 模型映射
 MODEL_MAP = {
@@ -16,6 +28,8 @@ MODEL_MAP = {
     "jimeng-xl-pro": "text2img_xl_sft",
 }
 
+ModelName = Literal["jimeng-2.1", "jimeng-2.0-pro", "jimeng-2.0", "jimeng-1.4", "jimeng-xl-pro"]
+
 # 常量定义
 DEFAULT_MODEL = "jimeng-2.1"
 MODEL_NAME = "jimeng"
@@ -23,6 +37,25 @@ DEFAULT_ASSISTANT_ID = "513695"
 VERSION_CODE = "5.8.0"
 PLATFORM_CODE = "7"
 DRAFT_VERSION = "3.0.2"
+# 可通过环境变量指向本地模拟服务（见 benchmarks/jimeng_mock_server.py）
+BASE_URL = os.getenv("JIMENG_BASE_URL", "https://jimeng.jianying.com")
+
+# 生成记录状态
+STATUS_PENDING = 20
+STATUS_FAILED = 30
+
+# 批量生成时默认的最大并发数
+DEFAULT_BATCH_CONCURRENCY = 4
+# 单次 get_history_by_ids 请求最多查询的记录数
+MAX_HISTORY_BATCH = 50
+
+# HTTP连接池配置，同一事件循环内的所有请求共享keep-alive连接
+HTTP_TIMEOUT = 15
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=60,
+)
 
 # 生成随机ID
 DEVICE_ID = str(int(random.random() * 999999999999999999 + 7000000000000000000))
@@ -45,11 +78,30 @@ class Util:
 # 生成用户ID
 USER_ID = Util.uuid(False)
 
+# 每个请求都相同的URL参数和请求头，只读共享
+BASE_PARAMS: Mapping[str, str] = MappingProxyType({
+    "aid": DEFAULT_ASSISTANT_ID,
+    "device_platform": "web",
+    "region": "CN",
+    "web_id": WEB_ID,
+})
+
+BASE_HEADERS: Mapping[str, str] = MappingProxyType({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+    "Sign-Ver": "1",
+    "Pf": PLATFORM_CODE,
+    "Referer": "https://jimeng.jianying.com",
+    "Appid": DEFAULT_ASSISTANT_ID,
+    "Appvr": VERSION_CODE,
+})
+
 class APIException(Exception):
     """API异常类"""
-    def __init__(self, code: str, message: str):
+    def __init__(self, code: str, message: str, ret: Optional[str] = None):
         self.code = code
         self.message = message
+        # 接口返回的原始 ret（HTTP 429 时为 "429"），不是接口错误时为None
+        self.ret = ret
         super().__init__(message)
 
 class ErrorCode:
@@ -58,6 +110,240 @@ class ErrorCode:
     API_IMAGE_GENERATION_FAILED = "API_IMAGE_GENERATION_FAILED"
     API_IMAGE_GENERATION_INSUFFICIENT_POINTS = "API_IMAGE_GENERATION_INSUFFICIENT_POINTS"
     API_CONTENT_FILTERED = "API_CONTENT_FILTERED"
+    API_IMAGE_GENERATION_TIMEOUT = "API_IMAGE_GENERATION_TIMEOUT"
+    API_RATE_LIMITED = "API_RATE_LIMITED"
+    API_RECORD_NOT_FOUND = "API_RECORD_NOT_FOUND"
+
+def build_image_info() -> Dict[str, Any]:
+    """构建查询生成结果时使用的图片规格配置
+    
+    Returns:
+        image_info 配置字典
+    """
+    return {
+        "width": 2048,
+        "height": 2048,
+        "format": "webp",
+        "image_scene_list": [
+            {
+                "scene": "smart_crop",
+                "width": size,
+                "height": size,
+                "uniq_key": f"smart_crop-w:{size}-h:{size}",
+                "format": "webp",
+            }
+            for size in [360, 480, 720]
+        ] + [
+            {
+                "scene": "smart_crop",
+                "width": 720,
+                "height": 480,
+                "uniq_key": "smart_crop-w:720-h:480",
+                "format": "webp",
+            },
+            {
+                "scene": "smart_crop",
+                "width": 360,
+                "height": 240,
+                "uniq_key": "smart_crop-w:360-h:240",
+                "format": "webp",
+            },
+            {
+                "scene": "smart_crop",
+                "width": 240,
+                "height": 320,
+                "uniq_key": "smart_crop-w:240-h:320",
+                "format": "webp",
+            },
+            {
+                "scene": "smart_crop",
+                "width": 480,
+                "height": 640,
+                "uniq_key": "smart_crop-w:480-h:640",
+                "format": "webp",
+            }
+        ] + [
+            {
+                "scene": "normal",
+                "width": size,
+                "height": size,
+                "uniq_key": str(size),
+                "format": "webp",
+            }
+            for size in [2400, 1080, 720, 480, 360]
+        ]
+    }
+
+# 以下请求体中不变的部分在导入时构建并序列化一次
+IMAGE_INFO = build_image_info()
+
+HISTORY_QUERY_TEMPLATE = JsonTemplate({
+    "history_ids": placeholder("history_ids"),
+    "image_info": IMAGE_INFO,
+    "http_common_info": {
+        "aid": int(DEFAULT_ASSISTANT_ID),
+    }
+})
+
+METRICS_EXTRA = json.dumps({
+    "templateId": "",
+    "generateCount": 1,
+    "promptSource": "custom",
+    "templateSource": "",
+    "lastRequestId": "",
+    "originRequestId": ""
+})
+
+DRAFT_CONTENT_TEMPLATE = JsonTemplate({
+    "type": "draft",
+    "id": placeholder("draft_id"),
+    "min_version": DRAFT_VERSION,
+    "is_from_tsn": True,
+    "version": DRAFT_VERSION,
+    "main_component_id": placeholder("component_id"),
+    "component_list": [{
+        "type": "image_base_component",
+        "id": placeholder("component_id"),
+        "min_version": DRAFT_VERSION,
+        "generate_type": "generate",
+        "aigc_mode": "workbench",
+        "abilities": {
+            "type": "",
+            "id": placeholder("abilities_id"),
+            "generate": {
+                "type": "",
+                "id": placeholder("generate_id"),
+                "core_param": {
+                    "type": "",
+                    "id": placeholder("core_param_id"),
+                    "model": placeholder("model"),
+                    "prompt": placeholder("prompt"),
+                    "negative_prompt": placeholder("negative_prompt"),
+                    "seed": placeholder("seed"),
+                    "sample_strength": placeholder("sample_strength"),
+                    "image_ratio": 1,
+                    "large_image_info": {
+                        "type": "",
+                        "id": placeholder("large_image_info_id"),
+                        "height": placeholder("height"),
+                        "width": placeholder("width")
+                    }
+                },
+                "history_option": {
+                    "type": "",
+                    "id": placeholder("history_option_id")
+                }
+            }
+        }
+    }]
+})
+
+GENERATE_BODY_TEMPLATE = JsonTemplate({
+    "extend": {
+        "root_model": placeholder("model"),
+        "template_id": ""
+    },
+    "submit_id": placeholder("submit_id"),
+    "metrics_extra": METRICS_EXTRA,
+    "draft_content": placeholder("draft_content"),
+    "http_common_info": {
+        "aid": int(DEFAULT_ASSISTANT_ID)
+    }
+})
+
+T = TypeVar("T")
+
+# 每个事件循环一个共享的异步客户端（httpx连接不能跨事件循环复用）
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# 后台常驻事件循环，供同步调用方（Dify工具）共享
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def get_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的HTTP客户端
+    
+    Returns:
+        带连接池的httpx异步客户端
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=HTTP_TIMEOUT,
+            limits=HTTP_LIMITS,
+        )
+        _clients[loop] = client
+    return client
+
+async def close_client() -> None:
+    """关闭当前事件循环的HTTP客户端"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取后台常驻事件循环，不存在时创建
+    
+    Returns:
+        在守护线程中运行的事件循环
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="jimeng-event-loop",
+                daemon=True,
+            ).start()
+        return _loop
+
+def run_sync(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """在后台事件循环中执行协程并同步等待结果
+    
+    多个调用方可以同时提交协程，它们在同一个事件循环中并发执行，
+    并共享连接池。
+    
+    Args:
+        coro: 要执行的协程
+        timeout: 等待超时时间（秒）
+    
+    Returns:
+        协程的返回值
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+def iterate_sync(agen: AsyncIterator[T], timeout: Optional[float] = None) -> Iterator[T]:
+    """在后台事件循环中驱动异步生成器，并以同步迭代器的形式逐个返回结果
+    
+    Args:
+        agen: 异步生成器
+        timeout: 等待单个结果的超时时间（秒）
+    
+    Yields:
+        异步生成器产出的每个元素
+    """
+    async def anext() -> T:
+        return await agen.__anext__()
+    
+    async def aclose() -> None:
+        await agen.aclose()
+    
+    try:
+        while True:
+            try:
+                yield run_sync(anext(), timeout)
+            except StopAsyncIteration:
+                return
+    finally:
+        run_sync(aclose())
 
 def get_sign(uri: str, platform_code: str, version_code: str, device_time: int) -> str:
     """生成签名
@@ -74,11 +360,48 @@ def get_sign(uri: str, platform_code: str, version_code: str, device_time: int)
     sign_str = f"9e2c|{uri[-7:]}|{platform_code}|{version_code}|{device_time}||11ac"
     return hashlib.md5(sign_str.encode()).hexdigest()
 
-def check_result(response: requests.Response) -> Dict[str, Any]:
+@functools.lru_cache(maxsize=256)
+def _signed_headers(uri_suffix: str, device_time: int) -> Dict[str, str]:
+    """带签名的基础请求头
+    
+    签名只依赖URI末7位和秒级设备时间，同一秒内同一接口的请求复用同一份结果。
+    返回值是共享的缓存对象，调用方必须复制后再修改。
+    
+    Args:
+        uri_suffix: 请求路径的末7位
+        device_time: 设备时间戳（秒）
+    
+    Returns:
+        请求头（不含Cookie）
+    """
+    return {
+        **BASE_HEADERS,
+        "Device-Time": str(device_time),
+        "Sign": get_sign(uri_suffix, PLATFORM_CODE, VERSION_CODE, device_time),
+    }
+
+def build_headers(uri: str, cookie: str, device_time: Optional[int] = None) -> Dict[str, str]:
+    """构建请求头
+    
+    Args:
+        uri: 请求路径
+        cookie: 即梦网站的cookie
+        device_time: 设备时间戳（秒），为空时使用当前时间
+    
+    Returns:
+        可修改的请求头字典
+    """
+    if device_time is None:
+        device_time = int(time.time())
+    headers = _signed_headers(uri[-7:], device_time).copy()
+    headers["Cookie"] = cookie
+    return headers
+
+def check_result(response: httpx.Response) -> Dict[str, Any]:
     """检查API响应结果
     
     Args:
-        response: requests响应对象
+        response: httpx响应对象
     
     Returns:
         处理后的响应数据
@@ -86,6 +409,12 @@ def check_result(response: requests.Response) -> Dict[str, Any]:
     Raises:
         APIException: 当API返回错误时抛出
     """
+    if response.status_code == 429:
+        raise APIException(
+            ErrorCode.API_RATE_LIMITED,
+            "[请求jimeng失败]: 请求过于频繁",
+            ret="429"
+        )
     result = response.json()
     ret = result.get('ret')
     errmsg = result.get('errmsg', '')
@@ -102,11 +431,13 @@ def check_result(response: requests.Response) -> Dict[str, Any]:
     if ret == '5000':
         raise APIException(
             ErrorCode.API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
-            f"[无法生成图像]: 即梦积分可能不足，{errmsg}"
+            f"[无法生成图像]: 即梦积分可能不足，{errmsg}",
+            ret=ret
         )
     raise APIException(
         ErrorCode.API_REQUEST_FAILED,
-        f"[请求jimeng失败]: {errmsg}"
+        f"[请求jimeng失败]: {errmsg}",
+        ret=ret
     )
 
 async def request(
@@ -117,6 +448,7 @@ async def request(
     params: Optional[Dict[str, Any]] = None,
     headers: Optional[Dict[str, Any]] = None,
     response_type: Optional[str] = None,
+    content: Optional[str] = None,
 ) -> Dict[str, Any]:
     """发送请求到jimeng API
     
@@ -128,173 +460,453 @@ async def request(
         params: URL参数
         headers: 请求头
         response_type: 响应类型
+        content: 已序列化的JSON请求体，提供时忽略data
     
     Returns:
         处理后的响应数据
     """
-    device_time = int(time.time())
-    sign = get_sign(uri, PLATFORM_CODE, VERSION_CODE, device_time)
-    
-    # 构建请求参数
-    default_params = {
-        "aid": DEFAULT_ASSISTANT_ID,
-        "device_platform": "web",
-        "region": "CN",
-        "web_id": WEB_ID,
-    }
+    # 构建请求参数，没有额外参数时直接使用只读的默认参数
+    default_params = BASE_PARAMS
     if params:
-        default_params.update(params)
+        default_params = {**BASE_PARAMS, **params}
     
     # 构建请求头
-    default_headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-        "Cookie": cookie,
-        "Device-Time": str(device_time),
-        "Sign": sign,
-        "Sign-Ver": "1",
-        "Pf": PLATFORM_CODE,
-        "Referer": "https://jimeng.jianying.com",
-        "Appid": DEFAULT_ASSISTANT_ID,
-        "Appvr": VERSION_CODE,
-    }
+    default_headers = build_headers(uri, cookie)
+    if content is not None:
+        default_headers["Content-Type"] = "application/json"
     if headers:
         default_headers.update(headers)
     
-    response = requests.request(
-        method=method,
-        url=f"https://jimeng.jianying.com{uri}",
-        params=default_params,
-        headers=default_headers,
-        json=data,
-        timeout=15
-    )
+    metrics = get_metrics()
+    started = time.monotonic()
+    try:
+        # 超出限流或并发上限时排队等待，而不是直接请求失败
+        async with get_rate_limiter().limit(cookie, uri):
+            response = await get_client().request(
+                method=method,
+                url=uri,
+                params=default_params,
+                headers=default_headers,
+                json=data if content is None else None,
+                content=content,
+            )
+    except httpx.HTTPError as e:
+        metrics.counter("jimeng_request_errors_total", "即梦接口错误数",
+                        endpoint=uri, ret=type(e).__name__).inc()
+        raise
+    finally:
+        # 包含限流排队的时间
+        metrics.histogram("jimeng_request_seconds", "即梦接口请求耗时",
+                          endpoint=uri).observe(time.monotonic() - started)
     
     # 流式响应直接返回
     if response_type == 'stream':
         return response
+    
+    try:
+        return check_result(response)
+    except APIException as e:
+        metrics.counter("jimeng_request_errors_total", "即梦接口错误数",
+                        endpoint=uri, ret=e.ret).inc()
+        raise
+
+async def get_history_by_ids(cookie: str, history_ids: List[str]) -> Dict[str, Any]:
+    """批量查询生成记录
+    
+    Args:
+        cookie: 即梦网站的cookie
+        history_ids: 历史记录ID列表
+    
+    Returns:
+        以history_id为键的记录字典
+    """
+    return await request(
+        "post",
+        "/mweb/v1/get_history_by_ids",
+        cookie=cookie,
+        content=HISTORY_QUERY_TEMPLATE.render(history_ids=history_ids)
+    )
+
+def parse_record(record: Dict[str, Any]) -> List[str]:
+    """解析已结束的生成记录
+    
+    Args:
+        record: get_history_by_ids 返回的单条记录
+    
+    Returns:
+        生成的图片URL列表
+    
+    Raises:
+        APIException: 生成失败、内容被过滤或记录中没有图片时抛出
+    """
+    if record.get("status") == STATUS_FAILED:
+        if record.get("fail_code") == '2038':
+            raise APIException(ErrorCode.API_CONTENT_FILTERED, "[无法生成图像]: 内容被过滤")
+        raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "[无法生成图像]: 生成失败")
+    
+    # 提取图片URL，字段缺失或为空（如 "large_images": []、"image": null）时取封面图
+    urls = []
+    for item in record.get("item_list") or []:
+        if not isinstance(item, dict):
+            continue
+        large_images = (item.get("image") or {}).get("large_images")
+        first = large_images[0] if isinstance(large_images, list) and large_images else None
+        url = (first.get("image_url") if isinstance(first, dict) else None) \
+            or (item.get("common_attr") or {}).get("cover_url")
+        if url:
+            urls.append(url)
+    if not urls:
+        raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "[无法生成图像]: 生成结果中没有图片")
+    return urls
+
+class _TrackedJob:
+    """追踪中的单条生成记录"""
+    
+    def __init__(self, model: Optional[str], submitted_at: float, next_poll_at: float):
+        self.model = model
+        self.submitted_at = submitted_at
+        self.next_poll_at = next_poll_at
+        self.attempts = 0
+        # 最近一次查询失败的原因，等待超时时一并报告
+        self.last_error: Optional[BaseException] = None
+        # (future, 截止时间, 进度回调) 列表，每个等待方独立超时
+        self.waiters: List[tuple] = []
+
+class GenerationTracker:
+    """生成任务追踪器
+    
+    收集进程内所有等待中的history_id，按 PollScheduler 计算出的时间点
+    把到期的记录按账号合并为一次 get_history_by_ids 请求，并把结果分发给
+    各自的等待方。
+    """
+    
+    def __init__(self, scheduler: Optional[PollScheduler] = None, max_batch: int = MAX_HISTORY_BATCH):
+        """初始化
         
-    return check_result(response)
+        Args:
+            scheduler: 轮询调度器，为空时使用默认配置
+            max_batch: 单次请求最多查询的记录数
+        """
+        self.scheduler = scheduler or PollScheduler()
+        self.max_batch = max_batch
+        # cookie -> history_id -> 追踪中的记录
+        self._jobs: Dict[str, Dict[str, _TrackedJob]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    def track(
+        self,
+        cookie: str,
+        history_id: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> asyncio.Future:
+        """登记一个待完成的生成任务
+        
+        Args:
+            cookie: 提交任务时使用的cookie
+            history_id: 历史记录ID
+            model: 模型名称，用于估算首次轮询时间
+            timeout: 该等待方的超时时间（秒）
+            on_update: 每次轮询到未完成记录时的回调，参数为原始记录
+        
+        Returns:
+            该等待方独享的future，结果为图片URL列表
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        jobs = self._jobs.setdefault(cookie, {})
+        job = jobs.get(history_id)
+        if job is None:
+            now = time.monotonic()
+            job = jobs[history_id] = _TrackedJob(
+                model, now, now + self.scheduler.initial_delay(model))
+        job.waiters.append((future, self.scheduler.deadline(timeout), on_update))
+        
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+        return future
+    
+    def pending_count(self) -> int:
+        """当前等待中的记录数"""
+        return sum(len(jobs) for jobs in self._jobs.values())
+    
+    async def _run(self) -> None:
+        """轮询循环，没有等待中的任务时自动退出
+        
+        循环中出现意外错误时结算所有等待中的任务，不让等待方一直挂起。
+        """
+        try:
+            await self._loop()
+        except Exception as e:
+            for cookie, jobs in list(self._jobs.items()):
+                for history_id in list(jobs):
+                    self._settle(cookie, history_id, error=e)
+            self._jobs.clear()
+    
+    async def _loop(self) -> None:
+        while self._prune():
+            now = time.monotonic()
+            wake_at = min(
+                min(job.next_poll_at, *(waiter[1] for waiter in job.waiters))
+                for jobs in self._jobs.values()
+                for job in jobs.values()
+            )
+            if wake_at > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wake_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # 即将到期的记录一并查询，避免抖动把同一账号的轮询拆散
+            horizon = now + self.scheduler.base_interval / 2
+            batches = []
+            for cookie, jobs in self._jobs.items():
+                due = [history_id for history_id, job in jobs.items() if job.next_poll_at <= horizon]
+                for i in range(0, len(due), self.max_batch):
+                    batches.append((cookie, due[i:i + self.max_batch]))
+            if batches:
+                await asyncio.gather(*(self._poll(cookie, ids) for cookie, ids in batches))
+    
+    async def _poll(self, cookie: str, history_ids: List[str]) -> None:
+        """查询一批记录并结算已结束的任务
+        
+        查询本身失败（网络错误、限流等）时任务已经提交并消耗积分，不结算，
+        按退避间隔稍后重试，直到各等待方自己的截止时间。
+        """
+        try:
+            result = await get_history_by_ids(cookie, history_ids)
+        except Exception as e:
+            now = time.monotonic()
+            for history_id in history_ids:
+                job = self._jobs.get(cookie, {}).get(history_id)
+                if job is not None:
+                    job.attempts += 1
+                    job.last_error = e
+                    job.next_poll_at = now + self.scheduler.next_delay(job.attempts)
+            return
+        
+        for history_id in history_ids:
+            record = (result or {}).get(history_id)
+            if not record or not isinstance(record, dict):
+                self._settle(cookie, history_id, error=APIException(
+                    ErrorCode.API_RECORD_NOT_FOUND, "记录不存在"))
+                continue
+            if record.get("status") == STATUS_PENDING:
+                job = self._jobs.get(cookie, {}).get(history_id)
+                if job is not None:
+                    job.last_error = None
+                    job.attempts += 1
+                    job.next_poll_at = time.monotonic() + self.scheduler.next_delay(job.attempts)
+                    for future, _, on_update in job.waiters:
+                        if on_update is not None and not future.done():
+                            on_update(record)
+                continue
+            try:
+                urls = parse_record(record)
+            except Exception as e:
+                # 单条记录异常只结算该记录的等待方
+                self._settle(cookie, history_id, error=e)
+            else:
+                self._settle(cookie, history_id, urls=urls)
+    
+    def _settle(
+        self,
+        cookie: str,
+        history_id: str,
+        urls: Optional[List[str]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """结算某条记录的所有等待方"""
+        job = self._jobs.get(cookie, {}).pop(history_id, None)
+        if job is None:
+            return
+        elapsed = time.monotonic() - job.submitted_at
+        if error is None:
+            self.scheduler.record(job.model, elapsed)
+        self._observe(job, "succeeded" if error is None else "failed", elapsed, job.attempts + 1)
+        for future, _, _ in job.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(list(urls))
+    
+    def _prune(self) -> bool:
+        """清理已取消和已超时的等待方
+        
+        Returns:
+            是否还有等待中的任务
+        """
+        now = time.monotonic()
+        for cookie in list(self._jobs):
+            jobs = self._jobs[cookie]
+            for history_id in list(jobs):
+                waiters = []
+                last_error = jobs[history_id].last_error
+                for future, deadline, on_update in jobs[history_id].waiters:
+                    if not future.done() and deadline <= now:
+                        message = f"[无法生成图像]: 等待生成结果超时，记录ID: {history_id}"
+                        if last_error is not None:
+                            message += f"，最近一次查询失败: {last_error}"
+                        future.set_exception(APIException(ErrorCode.API_IMAGE_GENERATION_TIMEOUT, message))
+                    if not future.done():
+                        waiters.append((future, deadline, on_update))
+                if waiters:
+                    jobs[history_id].waiters = waiters
+                else:
+                    job = jobs.pop(history_id)
+                    self._observe(job, "abandoned", now - job.submitted_at, job.attempts)
+            if not jobs:
+                del self._jobs[cookie]
+        return bool(self._jobs)
+    
+    @staticmethod
+    def _observe(job: _TrackedJob, outcome: str, elapsed: float, polls: int) -> None:
+        """记录单个任务从开始追踪到结束的耗时和轮询次数"""
+        metrics = get_metrics()
+        model = job.model or DEFAULT_MODEL
+        metrics.histogram("jimeng_queue_to_complete_seconds", "提交后到生成结束的耗时",
+                          model=model, outcome=outcome).observe(elapsed)
+        metrics.histogram("jimeng_polls_per_job", "每个任务的轮询次数", POLL_BUCKETS,
+                          model=model, outcome=outcome).observe(polls)
 
-async def wait_for_generation(cookie: str, history_id: str) -> List[str]:
+# 每个事件循环一个追踪器
+_trackers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, GenerationTracker]" = weakref.WeakKeyDictionary()
+
+def get_tracker() -> GenerationTracker:
+    """获取当前事件循环共享的生成任务追踪器"""
+    loop = asyncio.get_running_loop()
+    tracker = _trackers.get(loop)
+    if tracker is None:
+        tracker = _trackers[loop] = GenerationTracker()
+    return tracker
+
+async def wait_for_generation(
+    cookie: str,
+    history_id: str,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> List[str]:
     """等待图片生成完成并获取结果
     
+    同一进程内的所有等待任务由 GenerationTracker 合并轮询，
+    轮询时机由 PollScheduler 按模型和历史耗时自适应调整。
+    
     Args:
         cookie: 即梦网站的cookie
         history_id: 历史记录ID
+        model: 模型名称
+        timeout: 整体等待超时时间（秒），为空时使用调度器默认值
     
     Returns:
         生成的图片URL列表
+    
+    Raises:
+        APIException: 生成失败或等待超时时抛出
     """
     if not history_id:
         raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "记录ID不存在")
     
-    status = 20
-    fail_code = None
-    item_list = []
+    return await get_tracker().track(cookie, history_id, model=model, timeout=timeout)
+
+def progress_event(history_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """把未完成的生成记录转换为进度事件
     
-    # 图片信息配置
-    image_info = {
-        "width": 2048,
-        "height": 2048,
-        "format": "webp",
-        "image_scene_list": [
-            {
-                "scene": "smart_crop",
-                "width": size,
-                "height": size,
-                "uniq_key": f"smart_crop-w:{size}-h:{size}",
-                "format": "webp",
-            }
-            for size in [360, 480, 720]
-        ] + [
-            {
-                "scene": "smart_crop",
-                "width": 720,
-                "height": 480,
-                "uniq_key": "smart_crop-w:720-h:480",
-                "format": "webp",
-            },
-            {
-                "scene": "smart_crop",
-                "width": 360,
-                "height": 240,
-                "uniq_key": "smart_crop-w:360-h:240",
-                "format": "webp",
-            },
-            {
-                "scene": "smart_crop",
-                "width": 240,
-                "height": 320,
-                "uniq_key": "smart_crop-w:240-h:320",
-                "format": "webp",
-            },
-            {
-                "scene": "smart_crop",
-                "width": 480,
-                "height": 640,
-                "uniq_key": "smart_crop-w:480-h:640",
-                "format": "webp",
-            }
-        ] + [
-            {
-                "scene": "normal",
-                "width": size,
-                "height": size,
-                "uniq_key": str(size),
-                "format": "webp",
-            }
-            for size in [2400, 1080, 720, 480, 360]
-        ]
-    }
+    Args:
+        history_id: 历史记录ID
+        record: get_history_by_ids 返回的单条记录
     
-    while status == 20:
-        await asyncio.sleep(1)  # 等待1秒
-        
-        result = await request(
-            "post",
-            "/mweb/v1/get_history_by_ids",
-            cookie=cookie,
-            data={
-                "history_ids": [history_id],
-                "image_info": image_info,
-                "http_common_info": {
-                    "aid": int(DEFAULT_ASSISTANT_ID),
-                }
-            }
-        )
-        
-        if not result.get(history_id):
-            raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "记录不存在")
-            
-        record = result[history_id]
-        status = record["status"]
-        fail_code = record.get("fail_code")
-        item_list = record.get("item_list", [])
-    
-    if status == 30:
-        if fail_code == '2038':
-            raise APIException(ErrorCode.API_CONTENT_FILTERED)
-        else:
-            raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED)
+    Returns:
+        queued 或 generating 事件
+    """
+    queue_info = record.get("queue_info") or {}
+    queue_idx = queue_info.get("queue_idx") or 0
+    if queue_idx > 0:
+        return {
+            "event": "queued",
+            "history_id": history_id,
+            "queue_position": queue_idx,
+            "queue_length": queue_info.get("queue_length"),
+        }
+    return {"event": "generating", "history_id": history_id}
+
+async def watch_generation(
+    cookie: str,
+    history_id: str,
+    model: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """等待图片生成完成，并在等待过程中逐个返回进度事件
     
-    # 提取图片URL
-    return [
-        item.get("image", {}).get("large_images", [{}])[0].get("image_url")
-        or item.get("common_attr", {}).get("cover_url")
-        for item in item_list
-        if item
-    ]
+    事件类型：
+        queued: 排队中，附带 queue_position
+        generating: 生成中
+        image: 单张图片完成，附带 index 和 url
+        completed: 全部完成，附带 urls
+    
+    Args:
+        cookie: 即梦网站的cookie
+        history_id: 历史记录ID
+        model: 模型名称
+        timeout: 整体等待超时时间（秒）
+    
+    Yields:
+        进度事件字典
+    
+    Raises:
+        APIException: 生成失败或等待超时时抛出
+    """
+    if not history_id:
+        raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "记录ID不存在")
+    
+    # 轮询结果通过队列转交给生成器，None 表示任务已结束
+    updates: asyncio.Queue = asyncio.Queue()
+    future = get_tracker().track(
+        cookie, history_id, model=model, timeout=timeout, on_update=updates.put_nowait)
+    future.add_done_callback(lambda _: updates.put_nowait(None))
+    
+    try:
+        last_event = None
+        while (record := await updates.get()) is not None:
+            event = progress_event(history_id, record)
+            if event != last_event:
+                last_event = event
+                yield event
+        urls = future.result()
+    finally:
+        future.cancel()
+    
+    for index, url in enumerate(urls):
+        yield {"event": "image", "history_id": history_id, "index": index, "url": url}
+    yield {"event": "completed", "history_id": history_id, "urls": urls}
 
-async def generate_image(
+async def in_executor(func: Callable[..., T], *args: Any) -> T:
+    """在默认线程池中执行同步的阻塞操作（如任务日志的SQLite读写），不阻塞事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+def random_seed() -> int:
+    """按当前时间生成随机种子"""
+    return int(time.time() * 1000) % 100000000 + 2500000000
+
+async def submit_generation(
     cookie: str,
     prompt: str,
-    model: Literal["jimeng-2.1", "jimeng-2.0-pro", "jimeng-2.0", "jimeng-1.4", "jimeng-xl-pro"] = DEFAULT_MODEL,
+    model: ModelName = DEFAULT_MODEL,
     negative_prompt: str = "",
     width: int = 1024,
     height: int = 1024,
     sample_strength: float = 0.75,
-) -> List[str]:
-    """生成图片
+    seed: Optional[int] = None,
+) -> str:
+    """提交图片生成草稿
     
     Args:
         cookie: 即梦网站的cookie
@@ -304,102 +916,691 @@ async def generate_image(
         width: 图片宽度
         height: 图片高度
         sample_strength: 采样强度
+        seed: 随机种子，为空时按当前时间生成
     
     Returns:
-        生成的图片URL列表
+        生成记录ID（history_record_id）
     """
     
     # 获取实际的模型标识符
     model_identifier = MODEL_MAP[model]
-    
-    # 生成必要的参数
     component_id = str(uuid.uuid4())
-    device_time = int(time.time())
-    uri = "/mweb/v1/aigc_draft/generate"
-    
-    # 获取签名
-    sign = get_sign(uri, PLATFORM_CODE, VERSION_CODE, device_time)
-    
-    # 构建请求参数
-    babi_param = {
-        "scenario": "image_video_generation",
-        "feature_key": "aigc_to_image",
-        "feature_entrance": "to_image",
-        "feature_entrance_detail": f"to_image-{model_identifier}"
-    }
     
-    data = {
-        "extend": {
-            "root_model": model_identifier,
-            "template_id": ""
-        },
-        "submit_id": str(uuid.uuid4()),
-        "metrics_extra": json.dumps({
-            "templateId": "",
-            "generateCount": 1,
-            "promptSource": "custom",
-            "templateSource": "",
-            "lastRequestId": "",
-            "originRequestId": ""
-        }),
-        "draft_content": json.dumps({
-            "type": "draft",
-            "id": str(uuid.uuid4()),
-            "min_version": DRAFT_VERSION,
-            "is_from_tsn": True,
-            "version": DRAFT_VERSION,
-            "main_component_id": component_id,
-            "component_list": [{
-                "type": "image_base_component",
-                "id": component_id,
-                "min_version": DRAFT_VERSION,
-                "generate_type": "generate",
-                "aigc_mode": "workbench",
-                "abilities": {
-                    "type": "",
-                    "id": str(uuid.uuid4()),
-                    "generate": {
-                        "type": "",
-                        "id": str(uuid.uuid4()),
-                        "core_param": {
-                            "type": "",
-                            "id": str(uuid.uuid4()),
-                            "model": model_identifier,
-                            "prompt": prompt,
-                            "negative_prompt": negative_prompt,
-                            "seed": int(time.time() * 1000) % 100000000 + 2500000000,
-                            "sample_strength": sample_strength,
-                            "image_ratio": 1,
-                            "large_image_info": {
-                                "type": "",
-                                "id": str(uuid.uuid4()),
-                                "height": height,
-                                "width": width
-                            }
-                        },
-                        "history_option": {
-                            "type": "",
-                            "id": str(uuid.uuid4())
-                        }
-                    }
-                }
-            }]
-        }),
-        "http_common_info": {
-            "aid": int(DEFAULT_ASSISTANT_ID)
-        }
-    }
+    # 只填入动态字段，其余部分来自预序列化的模板
+    draft_content = DRAFT_CONTENT_TEMPLATE.render(
+        draft_id=str(uuid.uuid4()),
+        component_id=component_id,
+        abilities_id=str(uuid.uuid4()),
+        generate_id=str(uuid.uuid4()),
+        core_param_id=str(uuid.uuid4()),
+        model=model_identifier,
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        seed=random_seed() if seed is None else seed,
+        sample_strength=sample_strength,
+        large_image_info_id=str(uuid.uuid4()),
+        height=height,
+        width=width,
+        history_option_id=str(uuid.uuid4()),
+    )
+    body = GENERATE_BODY_TEMPLATE.render(
+        model=model_identifier,
+        submit_id=str(uuid.uuid4()),
+        draft_content=draft_content,
+    )
     
+    started = time.monotonic()
     response = await request(
         "post", 
         "/mweb/v1/aigc_draft/generate",
         cookie=cookie,
-        data=data
+        content=body
     )
+    get_metrics().histogram("jimeng_submit_seconds", "提交草稿的耗时",
+                            model=model).observe(time.monotonic() - started)
     
     # 从aigc_data中获取history_record_id
     aigc_data = response.get('aigc_data', {})
     history_id = aigc_data.get('history_record_id')
+    if not history_id:
+        raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, "记录ID不存在")
+    return history_id
+
+async def get_credit(cookie: str) -> int:
+    """查询账号剩余积分
+    
+    Args:
+        cookie: 即梦网站的cookie
+    
+    Returns:
+        赠送、购买和会员积分之和
+    """
+    result = await request(
+        "post",
+        "/commerce/v1/benefits/user_credit",
+        cookie=cookie,
+        data={},
+        headers={"Referer": "https://jimeng.jianying.com/ai-tool/image/generate"}
+    )
+    credit = (result or {}).get("credit") or {}
+    return sum(int(credit.get(k) or 0) for k in ("gift_credit", "purchase_credit", "vip_credit"))
+
+async def refresh_pool_points(pool: CookiePool) -> None:
+    """查询账号池中所有账号的剩余积分
+    
+    Args:
+        pool: 账号池
+    """
+    async def refresh(account: Account) -> None:
+        try:
+            pool.update_points(account, await get_credit(account.cookie))
+        except Exception:
+            # 查询失败时保留原有状态，由提交结果继续修正
+            pass
+    
+    await asyncio.gather(*(refresh(account) for account in pool.accounts))
+
+async def submit_with_pool(pool: CookiePool, prompt: str, **kwargs: Any) -> Tuple[Account, str]:
+    """从账号池中选择账号提交草稿
+    
+    优先选择仍有积分且进行中的生成最少的账号，遇到积分不足或限流时
+    标记该账号并换下一个账号重试。成功时账号保持占用，调用方在生成结束后
+    需调用 pool.release(account, spent=True)。
+    
+    Args:
+        pool: 账号池
+        prompt: 提示词
+        **kwargs: 透传给 submit_generation 的其余参数
+    
+    Returns:
+        (使用的账号, 生成记录ID)
+    
+    Raises:
+        APIException: 所有账号都不可用时抛出最后一次的错误
+    """
+    tried: List[Account] = []
+    last_error: Optional[APIException] = None
+    while True:
+        account = pool.acquire(exclude=tried)
+        if account is None:
+            raise last_error or APIException(
+                ErrorCode.API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
+                "[无法生成图像]: 账号池中没有可用的账号"
+            )
+        try:
+            return account, await submit_generation(account.cookie, prompt, **kwargs)
+        except APIException as e:
+            pool.release(account)
+            if e.code == ErrorCode.API_IMAGE_GENERATION_INSUFFICIENT_POINTS:
+                pool.mark_exhausted(account)
+            elif e.code == ErrorCode.API_RATE_LIMITED:
+                pool.mark_throttled(account)
+            else:
+                raise
+            tried.append(account)
+            last_error = e
+        except BaseException:
+            pool.release(account)
+            raise
+
+class _Flight:
+    """进行中的一次生成及其等待方数量"""
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+# 每个事件循环中按归一化参数索引的进行中生成，生成结束后立即移除
+_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, _Flight]]" = weakref.WeakKeyDictionary()
+
+def generation_key(
+    model: str,
+    prompt: str,
+    negative_prompt: str,
+    width: int,
+    height: int,
+    sample_strength: float,
+    seed: Optional[int] = None,
+) -> tuple:
+    """归一化生成参数，作为合并并发请求的键
+    
+    Returns:
+        参数元组
+    """
+    return (
+        model,
+        prompt.strip(),
+        negative_prompt.strip(),
+        int(width),
+        int(height),
+        round(float(sample_strength), 4),
+        seed,
+    )
+
+def account_key(cookie: Union[str, CookiePool]) -> tuple:
+    """提交所用账号的标识，不同账号（或账号池）的请求不会合并
+    
+    Returns:
+        账号指纹元组
+    """
+    if isinstance(cookie, CookiePool):
+        return tuple(account.fingerprint for account in cookie.accounts)
+    return (fingerprint(cookie),)
+
+async def generate_image(
+    cookie: Union[str, CookiePool],
+    prompt: str,
+    model: ModelName = DEFAULT_MODEL,
+    negative_prompt: str = "",
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.75,
+    timeout: Optional[float] = None,
+    seed: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+    journal: Optional[JobJournal] = None,
+    coalesce: bool = True,
+) -> List[str]:
+    """生成图片
+    
+    Args:
+        cookie: 即梦网站的cookie，或多账号的 CookiePool
+        prompt: 提示词
+        model: 模型名称
+        negative_prompt: 反向提示词
+        width: 图片宽度
+        height: 图片高度
+        sample_strength: 采样强度
+        timeout: 等待生成结果的超时时间（秒）
+        seed: 随机种子
+        cache: 结果缓存，提供且指定了 seed 时，同一账号相同参数直接返回之前的生成结果
+        journal: 任务日志，提供时记录提交的任务，并接续相同参数的未完成任务
+        coalesce: 是否与进行中的相同请求合并，批量生成的多个草稿需要各自提交
+    
+    同一账号同时进行的相同参数请求（见 generation_key、account_key）只会提交一次草稿，
+    所有调用方得到相同的图片URL列表；timeout、cache、journal 不同的请求不会合并。
+    
+    Returns:
+        生成的图片URL列表
+    """
+    metrics = get_metrics()
+    started = time.monotonic()
+    if seed is None:
+        # 只有固定种子的生成结果是确定的，随机种子的请求不读写缓存
+        cache = None
+    if cache is not None:
+        urls = await in_executor(cache.get, ResultCache.make_key(
+            model, prompt, negative_prompt, width, height, sample_strength, seed, account_key(cookie)))
+        if urls is not None:
+            metrics.counter("jimeng_generations_total", "generate_image 调用数",
+                            model=model, source="cache", outcome="succeeded").inc()
+            return urls
     
-    # 等待生成完成并返回结果
-    return await wait_for_generation(cookie, history_id)
+    # 同一账号、相同参数和等待设置的并发请求共享同一次提交；
+    # 缓存和任务日志按对象区分（进行中的任务持有它们的引用，id 不会被复用）
+    key = (
+        account_key(cookie),
+        *generation_key(model, prompt, negative_prompt, width, height, sample_strength, seed),
+        timeout,
+        id(cache) if cache is not None else None,
+        id(journal) if journal is not None else None,
+    )
+    flights = _flights.setdefault(asyncio.get_running_loop(), {})
+    flight = flights.get(key) if coalesce else None
+    source = "shared" if flight is not None else "submitted"
+    if flight is None:
+        flight = _Flight(asyncio.ensure_future(_generate(
+            cookie, prompt, model, negative_prompt, width, height,
+            sample_strength, timeout, seed, cache, journal,
+        )))
+        if coalesce:
+            flights[key] = flight
+            flight.task.add_done_callback(
+                lambda _: flights.pop(key) if flights.get(key) is flight else None)
+    
+    flight.waiters += 1
+    outcome = "failed"
+    try:
+        urls = list(await asyncio.shield(flight.task))
+        outcome = "succeeded"
+        return urls
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        metrics.counter("jimeng_generations_total", "generate_image 调用数",
+                        model=model, source=source, outcome=outcome).inc()
+        metrics.histogram("jimeng_generate_seconds", "generate_image 的端到端耗时",
+                          model=model, source=source, outcome=outcome).observe(time.monotonic() - started)
+        flight.waiters -= 1
+        # 所有等待方都已放弃时取消提交
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+async def _generate(
+    cookie: Union[str, CookiePool],
+    prompt: str,
+    model: ModelName,
+    negative_prompt: str,
+    width: int,
+    height: int,
+    sample_strength: float,
+    timeout: Optional[float],
+    seed: Optional[int],
+    cache: Optional[ResultCache],
+    journal: Optional[JobJournal] = None,
+) -> List[str]:
+    """提交草稿并等待结果，成功后写入缓存
+    
+    提供任务日志时，先查找相同参数、相同账号、近期提交的未完成任务并直接接续
+    （服务端已不再返回该记录时重新提交），否则提交后把任务记入日志。
+    """
+    params = dict(
+        model=model,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        sample_strength=sample_strength,
+        seed=seed,
+    )
+    pool = cookie if isinstance(cookie, CookiePool) else None
+    key = None
+    resumed = None
+    if journal is not None:
+        key = params_key(model, prompt, negative_prompt, width, height, sample_strength, seed)
+        cookies = {a.fingerprint: a.cookie for a in pool.accounts} if pool else {fingerprint(cookie): cookie}
+        resumed = await in_executor(journal.find_pending, key, list(cookies))
+    
+    urls = None
+    if resumed is not None:
+        # 接续进程重启或超时前提交的任务，不再重复提交
+        try:
+            urls = await _wait_journaled(
+                journal, cookies[resumed["account"]], resumed["history_id"], model, timeout)
+        except APIException as e:
+            # 服务端已经不再返回该记录时重新提交（日志中已记为失败）
+            if e.code != ErrorCode.API_RECORD_NOT_FOUND:
+                raise
+    
+    if urls is None and pool is not None:
+        account, history_id = await submit_with_pool(pool, prompt, **params)
+        try:
+            if journal is not None:
+                await in_executor(
+                    journal.record_submitted, history_id, account.fingerprint, model, dict(params, prompt=prompt), key)
+            urls = await _wait_journaled(journal, account.cookie, history_id, model, timeout)
+        finally:
+            pool.release(account, spent=True)
+    elif urls is None:
+        history_id = await submit_generation(cookie, prompt, **params)
+        if journal is not None:
+            await in_executor(
+                journal.record_submitted, history_id, fingerprint(cookie), model, dict(params, prompt=prompt), key)
+        # 等待生成完成并返回结果
+        urls = await _wait_journaled(journal, cookie, history_id, model, timeout)
+    if cache is not None:
+        await in_executor(cache.put, ResultCache.make_key(
+            model, prompt, negative_prompt, width, height, sample_strength, seed, account_key(cookie)), urls)
+    return urls
+
+def params_key(
+    model: str,
+    prompt: str,
+    negative_prompt: str,
+    width: int,
+    height: int,
+    sample_strength: float,
+    seed: Optional[int] = None,
+) -> str:
+    """归一化生成参数的摘要，作为任务日志中查找相同任务的键"""
+    key = generation_key(model, prompt, negative_prompt, width, height, sample_strength, seed)
+    return hashlib.sha256(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def _wait_journaled(
+    journal: Optional[JobJournal],
+    cookie: str,
+    history_id: str,
+    model: Optional[str],
+    timeout: Optional[float],
+) -> List[str]:
+    """等待生成结果并把最终状态写入任务日志
+    
+    等待超时的任务保持未完成状态，之后可以通过 resume_generation 继续获取结果。
+    """
+    try:
+        urls = await wait_for_generation(cookie, history_id, model=model, timeout=timeout)
+    except APIException as e:
+        if journal is not None and e.code != ErrorCode.API_IMAGE_GENERATION_TIMEOUT:
+            await in_executor(journal.record_failed, history_id, e.message)
+        raise
+    if journal is not None:
+        await in_executor(journal.record_succeeded, history_id, urls)
+    return urls
+
+async def resume_generation(
+    cookie: Union[str, CookiePool],
+    history_id: str,
+    journal: Optional[JobJournal] = None,
+    timeout: Optional[float] = None,
+) -> List[str]:
+    """接续之前提交的生成任务，不重新提交
+    
+    日志中已结束的任务直接返回记录的结果，未完成的任务重新加入轮询。
+    
+    Args:
+        cookie: 提交该任务的账号cookie，或包含该账号的 CookiePool
+        history_id: 历史记录ID
+        journal: 任务日志，为空时使用进程共享的日志
+        timeout: 等待生成结果的超时时间（秒）
+    
+    Returns:
+        生成的图片URL列表
+    
+    Raises:
+        APIException: 任务失败或等待超时时抛出
+    """
+    journal = journal or get_job_journal()
+    job = await in_executor(journal.get, history_id)
+    if job is not None and job["state"] == STATE_SUCCEEDED:
+        return job["urls"]
+    if job is not None and job["state"] == STATE_FAILED:
+        raise APIException(ErrorCode.API_IMAGE_GENERATION_FAILED, job["error"] or "[无法生成图像]: 生成失败")
+    if isinstance(cookie, CookiePool):
+        # 按日志中记录的账号指纹找到提交该任务的账号
+        account = job and next((a for a in cookie.accounts if a.fingerprint == job["account"]), None)
+        cookie = (account or cookie.accounts[0]).cookie
+    return await _wait_journaled(journal, cookie, history_id, job["model"] if job else None, timeout)
+
+async def resume_pending(
+    cookie: str,
+    journal: Optional[JobJournal] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """接续某个账号所有未完成的生成任务
+    
+    Args:
+        cookie: 账号cookie
+        journal: 任务日志，为空时使用进程共享的日志
+        timeout: 等待生成结果的超时时间（秒）
+    
+    Returns:
+        以history_id为键的结果，值包含 urls 或 error
+    """
+    journal = journal or get_job_journal()
+    jobs = await in_executor(journal.pending, fingerprint(cookie))
+    
+    async def resume(job: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return {"urls": await resume_generation(cookie, job["history_id"], journal, timeout)}
+        except APIException as e:
+            return {"error": e.message}
+    
+    results = await asyncio.gather(*(resume(job) for job in jobs))
+    return {job["history_id"]: result for job, result in zip(jobs, results)}
+
+def parse_prompts(value: Any) -> List[str]:
+    """解析批量提示词，支持列表、JSON数组或每行一个提示词
+    
+    Args:
+        value: 工具参数中的批量提示词
+    
+    Returns:
+        去除空白后的提示词列表
+    """
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(p).strip() for p in value if str(p).strip()]
+    value = str(value).strip()
+    if value.startswith('['):
+        try:
+            return [str(p).strip() for p in json.loads(value) if str(p).strip()]
+        except json.JSONDecodeError:
+            raise Exception('批量提示词格式错误，应为JSON数组或每行一个提示词')
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+async def submit_generations(
+    cookie: Union[str, CookiePool],
+    prompts: List[str],
+    count: int = 1,
+    model: ModelName = DEFAULT_MODEL,
+    negative_prompt: str = "",
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.75,
+    seed: Optional[int] = None,
+    journal: Optional[JobJournal] = None,
+) -> List[Dict[str, Any]]:
+    """批量提交草稿，不等待生成结果
+    
+    提交的节奏由限流器控制。提交成功的任务记入任务日志，之后可以用
+    fetch_generations 查询结果。
+    
+    Args:
+        cookie: 即梦网站的cookie，或多账号的 CookiePool
+        prompts: 提示词列表
+        count: 每个提示词提交的草稿数
+        model: 模型名称
+        negative_prompt: 反向提示词
+        width: 图片宽度
+        height: 图片高度
+        sample_strength: 采样强度
+        seed: 随机种子
+        journal: 任务日志，为空时使用进程共享的日志
+    
+    Returns:
+        与提交顺序一致的结果列表，每项包含 index、prompt，以及 history_id 或 error
+    """
+    journal = journal or get_job_journal()
+    params = dict(
+        model=model,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        sample_strength=sample_strength,
+        seed=seed,
+    )
+    
+    async def submit(index: int, prompt: str) -> Dict[str, Any]:
+        try:
+            if isinstance(cookie, CookiePool):
+                account, history_id = await submit_with_pool(cookie, prompt, **params)
+                cookie.release(account, spent=True)
+                account_id = account.fingerprint
+            else:
+                history_id = await submit_generation(cookie, prompt, **params)
+                account_id = fingerprint(cookie)
+        except APIException as e:
+            return {"index": index, "prompt": prompt, "error": e.message}
+        await in_executor(
+            journal.record_submitted, history_id, account_id, model, dict(params, prompt=prompt),
+            params_key(model, prompt, negative_prompt, width, height, sample_strength, seed))
+        return {"index": index, "prompt": prompt, "history_id": history_id}
+    
+    jobs = [prompt for prompt in prompts for _ in range(max(1, count))]
+    return list(await asyncio.gather(*(submit(i, p) for i, p in enumerate(jobs))))
+
+async def fetch_generations(
+    cookie: Union[str, CookiePool],
+    history_ids: List[str],
+    journal: Optional[JobJournal] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """查询一次生成任务的当前状态，不等待
+    
+    同一账号的任务合并为批量的 get_history_by_ids 请求。使用账号池时，
+    按任务日志中记录的账号指纹选择查询用的cookie。
+    
+    Args:
+        cookie: 即梦网站的cookie，或多账号的 CookiePool
+        history_ids: 历史记录ID列表
+        journal: 任务日志，为空时使用进程共享的日志
+    
+    Returns:
+        以history_id为键的状态，status 为 pending、succeeded、failed 或 error；
+        succeeded 附带 urls，failed（任务已失败，不会再有结果）和 error（本次查询失败，
+        任务状态未知，稍后可重新查询）附带 error，pending 附带 stage
+    """
+    journal = journal or get_job_journal()
+    
+    # 按提交账号分组
+    groups: Dict[str, List[str]] = {}
+    for history_id in dict.fromkeys(history_ids):
+        if isinstance(cookie, CookiePool):
+            job = await in_executor(journal.get, history_id)
+            account = job and next((a for a in cookie.accounts if a.fingerprint == job["account"]), None)
+            groups.setdefault((account or cookie.accounts[0]).cookie, []).append(history_id)
+        else:
+            groups.setdefault(cookie, []).append(history_id)
+    
+    results: Dict[str, Dict[str, Any]] = {}
+    
+    async def query(account_cookie: str, ids: List[str]) -> None:
+        try:
+            records = await get_history_by_ids(account_cookie, ids) or {}
+        except (APIException, httpx.HTTPError) as e:
+            # 只把这一批记录标记为查询失败（可重试），不影响其他账号的查询
+            for history_id in ids:
+                results[history_id] = {"status": "error", "error": getattr(e, "message", None) or str(e)}
+            return
+        for history_id in ids:
+            record = records.get(history_id)
+            if not record:
+                results[history_id] = {"status": "failed", "error": "记录不存在"}
+            elif record.get("status") == STATUS_PENDING:
+                event = progress_event(history_id, record)
+                results[history_id] = {
+                    "status": "pending",
+                    "stage": event["event"],
+                    "queue_position": event.get("queue_position"),
+                }
+            else:
+                try:
+                    urls = parse_record(record)
+                except APIException as e:
+                    await in_executor(journal.record_failed, history_id, e.message)
+                    results[history_id] = {"status": "failed", "error": e.message}
+                else:
+                    await in_executor(journal.record_succeeded, history_id, urls)
+                    results[history_id] = {"status": "succeeded", "urls": urls}
+    
+    await asyncio.gather(*(
+        query(account_cookie, ids[i:i + MAX_HISTORY_BATCH])
+        for account_cookie, ids in groups.items()
+        for i in range(0, len(ids), MAX_HISTORY_BATCH)
+    ))
+    return {history_id: results[history_id] for history_id in dict.fromkeys(history_ids)}
+
+async def stream_generation(
+    cookie: Union[str, CookiePool],
+    prompt: str,
+    model: ModelName = DEFAULT_MODEL,
+    negative_prompt: str = "",
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.75,
+    timeout: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """生成图片并逐个返回进度事件
+    
+    先返回 submitted 事件，之后的事件与 watch_generation 相同。
+    
+    Args:
+        cookie: 即梦网站的cookie，或多账号的 CookiePool
+        prompt: 提示词
+        model: 模型名称
+        negative_prompt: 反向提示词
+        width: 图片宽度
+        height: 图片高度
+        sample_strength: 采样强度
+        timeout: 等待生成结果的超时时间（秒）
+        seed: 随机种子
+    
+    Yields:
+        进度事件字典
+    """
+    params = dict(
+        model=model,
+        negative_prompt=negative_prompt,
+        width=width,
+        height=height,
+        sample_strength=sample_strength,
+        seed=seed,
+    )
+    pool = cookie if isinstance(cookie, CookiePool) else None
+    account = None
+    if pool is not None:
+        account, history_id = await submit_with_pool(pool, prompt, **params)
+        cookie = account.cookie
+    else:
+        history_id = await submit_generation(cookie, prompt, **params)
+    
+    try:
+        yield {"event": "submitted", "history_id": history_id}
+        async for event in watch_generation(cookie, history_id, model=model, timeout=timeout):
+            yield event
+    finally:
+        if pool is not None:
+            pool.release(account, spent=True)
+
+async def generate_images(
+    cookie: Union[str, CookiePool],
+    prompts: List[str],
+    count: int = 1,
+    model: ModelName = DEFAULT_MODEL,
+    negative_prompt: str = "",
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.75,
+    timeout: Optional[float] = None,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """批量生成图片，按完成顺序逐个返回结果
+    
+    每个提示词提交 count 个草稿，同时进行中的生成数不超过 concurrency。
+    单个草稿失败不会中断其他草稿。
+    
+    Args:
+        cookie: 即梦网站的cookie，或多账号的 CookiePool
+        prompts: 提示词列表
+        count: 每个提示词提交的草稿数
+        model: 模型名称
+        negative_prompt: 反向提示词
+        width: 图片宽度
+        height: 图片高度
+        sample_strength: 采样强度
+        timeout: 单个草稿等待生成结果的超时时间（秒）
+        concurrency: 最大并发生成数
+    
+    Yields:
+        结果字典，包含 index、prompt，以及 urls 或 error
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(index: int, prompt: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                urls = await generate_image(
+                    cookie,
+                    prompt,
+                    model=model,
+                    negative_prompt=negative_prompt,
+                    width=width,
+                    height=height,
+                    sample_strength=sample_strength,
+                    timeout=timeout,
+                    # 同一提示词的多个草稿是独立的生成，不能合并
+                    coalesce=False,
+                )
+                return {"index": index, "prompt": prompt, "urls": urls}
+            except Exception as e:
+                return {"index": index, "prompt": prompt, "error": str(e)}
+    
+    jobs = [prompt for prompt in prompts for _ in range(max(1, count))]
+    tasks = [asyncio.ensure_future(run(index, prompt)) for index, prompt in enumerate(jobs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
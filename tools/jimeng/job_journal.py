@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# 任务状态
+STATE_PENDING = 'pending'
+STATE_SUCCEEDED = 'succeeded'
+STATE_FAILED = 'failed'
+# 超过该时间（秒）的未完成任务不再接续，服务端可能已经不再返回该记录
+PENDING_MAX_AGE = 60 * 60
+# 自动清理时已结束任务和未完成任务的保留时间（秒）
+FINISHED_RETENTION = 7 * 24 * 60 * 60
+PENDING_RETENTION = 24 * 60 * 60
+# 自动清理的最小间隔（秒）
+PRUNE_INTERVAL = 60 * 60
+
+class JobJournal:
+    """即梦生成任务日志
+
+    把已提交的 history_id 及其参数和状态记录到SQLite，
+    插件进程重启或工具调用超时后可以重新接上未完成的任务，而不必重新提交消耗积分。
+    日志只保存账号指纹，恢复任务时需要调用方提供对应的cookie。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """初始化
+
+        Args:
+            path: SQLite数据库文件路径，为空时使用 JIMENG_JOURNAL_PATH 或系统临时目录
+        """
+        self.path = path or os.getenv('JIMENG_JOURNAL_PATH') or os.path.join(
+            tempfile.gettempdir(), 'jimeng_jobs.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'history_id TEXT PRIMARY KEY, account TEXT NOT NULL, model TEXT, '
+            'params_key TEXT, params TEXT NOT NULL, state TEXT NOT NULL, '
+            'urls TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, account)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_params ON jobs (params_key, state)')
+        self._conn.commit()
+        self._pruned_at = 0.0
+        self._maybe_prune()
+
+    def record_submitted(
+        self,
+        history_id: str,
+        account: str,
+        model: Optional[str],
+        params: Dict[str, Any],
+        params_key: Optional[str] = None,
+    ) -> None:
+        """记录已提交的任务
+
+        Args:
+            history_id: 历史记录ID
+            account: 提交账号的指纹
+            model: 模型名称
+            params: 生成参数
+            params_key: 参数归一化后的键，用于相同参数的任务重新接续
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO jobs '
+                '(history_id, account, model, params_key, params, state, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (history_id, account, model, params_key,
+                 json.dumps(params, ensure_ascii=False), STATE_PENDING, now, now),
+            )
+            self._conn.commit()
+        self._maybe_prune()
+
+    def _maybe_prune(self) -> None:
+        """距上次清理超过 PRUNE_INTERVAL 时清理过期任务，避免日志文件无限增长"""
+        now = time.monotonic()
+        if self._pruned_at and now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        self.prune(FINISHED_RETENTION, PENDING_RETENTION)
+
+    def record_succeeded(self, history_id: str, urls: List[str]) -> None:
+        """记录任务成功及其结果"""
+        self._update(history_id, STATE_SUCCEEDED, urls=json.dumps(urls))
+
+    def record_failed(self, history_id: str, error: str) -> None:
+        """记录任务失败"""
+        self._update(history_id, STATE_FAILED, error=error)
+
+    def _update(self, history_id: str, state: str, urls: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET state = ?, urls = ?, error = ?, updated_at = ? WHERE history_id = ?',
+                (state, urls, error, time.time(), history_id),
+            )
+            self._conn.commit()
+
+    def get(self, history_id: str) -> Optional[Dict[str, Any]]:
+        """查询单个任务
+
+        Returns:
+            任务信息，不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE history_id = ?', (history_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def pending(self, account: Optional[str] = None) -> List[Dict[str, Any]]:
+        """查询未完成的任务
+
+        Args:
+            account: 账号指纹，为空时返回所有账号的任务
+
+        Returns:
+            按提交时间排序的任务列表
+        """
+        sql = 'SELECT * FROM jobs WHERE state = ?'
+        args: List[Any] = [STATE_PENDING]
+        if account:
+            sql += ' AND account = ?'
+            args.append(account)
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY created_at', args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def find_pending(
+        self,
+        params_key: str,
+        accounts: List[str],
+        max_age: float = PENDING_MAX_AGE,
+    ) -> Optional[Dict[str, Any]]:
+        """查找相同参数、属于给定账号、提交时间不超过 max_age 的未完成任务
+
+        Args:
+            params_key: 参数归一化后的键
+            accounts: 可用的账号指纹
+            max_age: 可接续任务的最长提交时间（秒）
+
+        Returns:
+            最近提交的任务，不存在时返回None
+        """
+        if not accounts:
+            return None
+        marks = ','.join('?' * len(accounts))
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT * FROM jobs WHERE params_key = ? AND state = ? AND account IN ({marks}) '
+                'AND created_at >= ? ORDER BY created_at DESC LIMIT 1',
+                [params_key, STATE_PENDING, *accounts, time.time() - max_age],
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def prune(self, max_age: float, pending_max_age: Optional[float] = None) -> int:
+        """删除超过指定时间的已结束任务
+
+        Args:
+            max_age: 保留时间（秒）
+            pending_max_age: 提供时同时删除提交超过该时间仍未完成的任务
+
+        Returns:
+            删除的任务数
+        """
+        now = time.time()
+        sql = 'DELETE FROM jobs WHERE (state != ? AND updated_at < ?)'
+        args: List[Any] = [STATE_PENDING, now - max_age]
+        if pending_max_age is not None:
+            sql += ' OR (state = ? AND created_at < ?)'
+            args += [STATE_PENDING, now - pending_max_age]
+        with self._lock:
+            cursor = self._conn.execute(sql, args)
+            self._conn.commit()
+        return cursor.rowcount
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['urls'] = json.loads(job['urls']) if job['urls'] else None
+        return job
+
+_default_journal: Optional[JobJournal] = None
+_default_journal_lock = threading.Lock()
+
+def get_job_journal() -> JobJournal:
+    """获取进程内共享的任务日志"""
+    global _default_journal
+    with _default_journal_lock:
+        if _default_journal is None:
+            _default_journal = JobJournal()
+        return _default_journal
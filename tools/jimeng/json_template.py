@@ -0,0 +1,69 @@
+import json
+import re
+from json.encoder import encode_basestring_ascii
+from typing import Any, List
+
+# 占位符格式：整个JSON值为 "${name}" 的字符串
+PLACEHOLDER_PATTERN = re.compile(r'"\$\{(\w+)\}"')
+
+def placeholder(name: str) -> str:
+    """生成模板占位符
+
+    Args:
+        name: 字段名
+
+    Returns:
+        放入模板结构中的占位字符串
+    """
+    return "${" + name + "}"
+
+def encode_value(value: Any) -> str:
+    """序列化单个JSON值，常见标量类型绕过 json.dumps 的调用开销
+
+    Args:
+        value: 要序列化的值
+
+    Returns:
+        与 json.dumps(value) 相同的文本
+    """
+    value_type = type(value)
+    if value_type is str:
+        return encode_basestring_ascii(value)
+    if value_type is int:
+        return int.__repr__(value)
+    if value_type is float and value == value and value not in (float("inf"), float("-inf")):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+class JsonTemplate:
+    """预序列化的JSON模板
+
+    构造时把不变的部分序列化一次，渲染时只对占位符处的动态值做序列化并拼接，
+    避免每次请求都重新构建嵌套字典并完整地执行 json.dumps。
+    """
+
+    def __init__(self, obj: Any):
+        """初始化
+
+        Args:
+            obj: 模板结构，动态字段的值使用 placeholder(name) 占位
+        """
+        parts = PLACEHOLDER_PATTERN.split(json.dumps(obj))
+        self._static: List[str] = parts[0::2]
+        self.fields: List[str] = parts[1::2]
+
+    def render(self, **values: Any) -> str:
+        """填入动态字段并返回JSON文本
+
+        Args:
+            **values: 各占位符对应的值，按JSON规则序列化
+
+        Returns:
+            JSON文本
+        """
+        static = self._static
+        out = [static[0]]
+        for i, name in enumerate(self.fields):
+            out.append(encode_value(values[name]))
+            out.append(static[i + 1])
+        return "".join(out)
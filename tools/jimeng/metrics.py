@@ -0,0 +1,190 @@
+import bisect
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 默认的直方图分桶上界（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 每个任务轮询次数的分桶上界
+POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class Counter:
+    """单调递增的计数器"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'value': self.value}
+
+class Histogram:
+    """按固定分桶统计观测值的直方图"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶估算分位数，落在 +Inf 桶时返回最大的有限上界"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative, seen = {}, 0
+        for bound, n in zip([*map(str, self.buckets), '+Inf'], counts):
+            seen += n
+            cumulative[bound] = seen
+        return {
+            'count': count,
+            'sum': total,
+            'buckets': cumulative,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+class MetricsRegistry:
+    """进程内的指标注册表
+
+    按指标名和标签保存计数器与直方图，可导出为JSON或Prometheus文本格式。
+    """
+
+    def __init__(self):
+        # name -> (类型, 说明, 标签 -> 指标)
+        self._metrics: Dict[str, Tuple[str, str, Dict[LabelKey, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, Any], factory) -> Any:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            entry = self._metrics.get(name)
+            if entry is None:
+                entry = self._metrics[name] = (kind, help, {})
+            elif entry[0] != kind:
+                raise ValueError(f'指标 {name} 已注册为 {entry[0]}')
+            series = entry[2]
+            metric = series.get(key)
+            if metric is None:
+                metric = series[key] = factory()
+            return metric
+
+    def counter(self, name: str, help: str = '', **labels: Any) -> Counter:
+        """获取（不存在时创建）计数器
+
+        Args:
+            name: 指标名
+            help: 指标说明
+            labels: 标签
+
+        Returns:
+            计数器
+        """
+        return self._get('counter', name, help, labels, Counter)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = '',
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **labels: Any,
+    ) -> Histogram:
+        """获取（不存在时创建）直方图
+
+        Args:
+            name: 指标名
+            help: 指标说明
+            buckets: 分桶上界，只在首次创建时生效
+            labels: 标签
+
+        Returns:
+            直方图
+        """
+        return self._get('histogram', name, help, labels, lambda: Histogram(buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前所有指标的快照"""
+        with self._lock:
+            metrics = {name: (kind, help, dict(series)) for name, (kind, help, series) in self._metrics.items()}
+        return {
+            name: {
+                'type': kind,
+                'help': help,
+                'series': [
+                    {'labels': dict(key), **metric.snapshot()}
+                    for key, metric in series.items()
+                ],
+            }
+            for name, (kind, help, series) in metrics.items()
+        }
+
+    def to_json(self) -> str:
+        """导出为JSON文本"""
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        lines: List[str] = []
+        for name, metric in self.snapshot().items():
+            if metric['help']:
+                lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for series in metric['series']:
+                labels = series['labels']
+                if metric['type'] == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {series['value']:g}")
+                    continue
+                for bound, count in series['buckets'].items():
+                    lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {series['sum']:g}")
+                lines.append(f"{name}_count{_format_labels(labels)} {series['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        with self._lock:
+            self._metrics.clear()
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+    return '{' + pairs + '}'
+
+_default_registry = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """获取进程内共享的指标注册表"""
+    return _default_registry
@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+# 各模型首次轮询前的等待时间（秒），为经验值，会被实际观测到的耗时逐步修正
+DEFAULT_INITIAL_DELAYS = {
+    "jimeng-2.1": 8.0,
+    "jimeng-2.0-pro": 8.0,
+    "jimeng-2.0": 6.0,
+    "jimeng-1.4": 4.0,
+    "jimeng-xl-pro": 12.0,
+}
+
+# 默认的整体等待超时（秒）
+DEFAULT_TIMEOUT = 180.0
+
+class PollScheduler:
+    """生成结果轮询调度器
+
+    首次轮询按模型预估耗时延后，之后按指数退避加抖动的间隔轮询，
+    并记录每个模型的实际完成耗时，使首次延迟逐步贴近真实耗时。
+    """
+
+    def __init__(
+        self,
+        initial_delays: Optional[Dict[str, float]] = None,
+        base_interval: float = 1.0,
+        max_interval: float = 8.0,
+        factor: float = 1.5,
+        jitter: float = 0.2,
+        timeout: float = DEFAULT_TIMEOUT,
+        smoothing: float = 0.3,
+        lead: float = 0.8,
+    ):
+        """初始化
+
+        Args:
+            initial_delays: 各模型的初始等待时间，未配置的模型使用 base_interval
+            base_interval: 退避起始间隔（秒）
+            max_interval: 退避最大间隔（秒）
+            factor: 退避倍数
+            jitter: 抖动比例，实际间隔在 ±jitter 范围内随机浮动
+            timeout: 默认的整体等待超时（秒）
+            smoothing: 观测耗时的指数平滑系数
+            lead: 首次轮询相对于预估耗时的提前比例
+        """
+        self.initial_delays = dict(DEFAULT_INITIAL_DELAYS if initial_delays is None else initial_delays)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.lead = lead
+        self._observed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def initial_delay(self, model: Optional[str]) -> float:
+        """首次轮询前的等待时间
+
+        Args:
+            model: 模型名称
+
+        Returns:
+            等待时间（秒）
+        """
+        with self._lock:
+            observed = self._observed.get(model)
+        if observed is not None:
+            delay = observed * self.lead
+        else:
+            delay = self.initial_delays.get(model, self.base_interval)
+        return self._jittered(max(delay, self.base_interval))
+
+    def next_delay(self, attempt: int) -> float:
+        """第 attempt 次轮询未完成后的等待时间
+
+        Args:
+            attempt: 已轮询次数（从1开始）
+
+        Returns:
+            等待时间（秒）
+        """
+        delay = self.base_interval * self.factor ** max(attempt - 1, 0)
+        return self._jittered(min(delay, self.max_interval))
+
+    def deadline(self, timeout: Optional[float] = None) -> float:
+        """计算等待截止时间
+
+        Args:
+            timeout: 超时时间（秒），为空时使用默认值
+
+        Returns:
+            基于 time.monotonic 的截止时间
+        """
+        return time.monotonic() + (self.timeout if timeout is None else timeout)
+
+    def record(self, model: Optional[str], elapsed: float) -> None:
+        """记录一次实际完成耗时
+
+        Args:
+            model: 模型名称
+            elapsed: 从提交到完成的耗时（秒）
+        """
+        with self._lock:
+            observed = self._observed.get(model)
+            if observed is None:
+                self._observed[model] = elapsed
+            else:
+                self._observed[model] = observed + self.smoothing * (elapsed - observed)
+
+    def observed(self) -> Dict[str, float]:
+        """各模型当前的平滑耗时估计"""
+        with self._lock:
+            return dict(self._observed)
+
+    def _jittered(self, delay: float) -> float:
+        if not self.jitter:
+            return delay
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+# 各接口每个账号每秒允许的请求数
+DEFAULT_RATES = {
+    "generate": 1.0,
+    "history": 2.0,
+    "default": 5.0,
+}
+# 全局同时进行中的请求上限
+DEFAULT_MAX_CONCURRENCY = 16
+
+# 接口路径与限流分组的对应关系
+ENDPOINTS = {
+    "/mweb/v1/aigc_draft/generate": "generate",
+    "/mweb/v1/get_history_by_ids": "history",
+}
+
+class TokenBucket:
+    """令牌桶
+
+    令牌不足时按到达顺序预约后续令牌并等待，而不是直接失败。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """初始化
+
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量，即允许的突发请求数，默认与rate相同且至少为1
+        """
+        self.rate = rate
+        self.capacity = max(1.0, rate if capacity is None else capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """取得一个令牌，必要时等待"""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return
+        try:
+            await asyncio.sleep(-self.tokens / self.rate)
+        except asyncio.CancelledError:
+            # 放弃等待时归还预约的令牌
+            self.tokens += 1
+            raise
+
+class RateLimiter:
+    """即梦请求限流器
+
+    每个账号的每类接口（提交、查询、其他）各有一个令牌桶，
+    所有请求再共享一个全局并发上限。
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        """初始化
+
+        Args:
+            rates: 各接口分组每个账号每秒允许的请求数
+            max_concurrency: 全局同时进行中的请求上限
+        """
+        self.rates = {**DEFAULT_RATES, **(rates or {})}
+        self.max_concurrency = max_concurrency
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def configure(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        """更新限流配置，已有的令牌桶按新速率继续工作
+
+        Args:
+            rates: 各接口分组每个账号每秒允许的请求数
+            max_concurrency: 全局同时进行中的请求上限
+        """
+        if rates:
+            self.rates.update(rates)
+            for (_, endpoint), bucket in self._buckets.items():
+                bucket.rate = self.rates[endpoint]
+                bucket.capacity = max(1.0, bucket.rate)
+        if max_concurrency and max_concurrency != self.max_concurrency:
+            # 已进入的请求仍释放旧的信号量
+            self.max_concurrency = max_concurrency
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def bucket(self, cookie: str, uri: str) -> TokenBucket:
+        """获取账号和接口对应的令牌桶"""
+        endpoint = ENDPOINTS.get(uri, "default")
+        key = (hashlib.sha256(cookie.encode('utf-8')).hexdigest(), endpoint)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rates[endpoint])
+        return bucket
+
+    @asynccontextmanager
+    async def limit(self, cookie: str, uri: str) -> AsyncIterator[None]:
+        """在限流范围内执行一次请求
+
+        Args:
+            cookie: 请求使用的cookie
+            uri: 请求路径
+        """
+        await self.bucket(cookie, uri).acquire()
+        semaphore = self._semaphore
+        async with semaphore:
+            yield
+
+# 进程级的限流配置，对之后创建和已存在的限流器都生效
+_config: Dict[str, object] = {"rates": {}, "max_concurrency": DEFAULT_MAX_CONCURRENCY}
+
+# 每个事件循环一个限流器（asyncio同步原语不能跨事件循环使用）
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, RateLimiter]" = weakref.WeakKeyDictionary()
+
+def configure_rate_limits(
+    rates: Optional[Dict[str, float]] = None,
+    max_concurrency: Optional[int] = None,
+) -> None:
+    """更新进程级的限流配置
+
+    Args:
+        rates: 各接口分组（generate、history、default）每个账号每秒允许的请求数
+        max_concurrency: 全局同时进行中的请求上限
+    """
+    if rates:
+        _config["rates"] = {**_config["rates"], **rates}
+    if max_concurrency:
+        _config["max_concurrency"] = max_concurrency
+    for limiter in list(_limiters.values()):
+        limiter.configure(rates, max_concurrency)
+
+def get_rate_limiter() -> RateLimiter:
+    """获取当前事件循环共享的限流器"""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = _limiters[loop] = RateLimiter(_config["rates"], _config["max_concurrency"])
+    return limiter
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# 即梦返回的图片地址带有签名，会在一段时间后失效，缓存有效期需短于签名有效期
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+class ResultCache:
+    """即梦生成结果缓存
+
+    以生成参数为键缓存图片URL列表，基于SQLite持久化，支持过期时间和LRU淘汰。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        """初始化
+
+        Args:
+            path: SQLite数据库文件路径，为空时使用 JIMENG_CACHE_PATH 或系统临时目录
+            ttl: 缓存有效期（秒）
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目
+        """
+        self.path = path or os.getenv('JIMENG_CACHE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'jimeng_result_cache.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, urls TEXT NOT NULL, '
+            'created_at REAL NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        negative_prompt: str,
+        width: int,
+        height: int,
+        sample_strength: float,
+        seed: Optional[int] = None,
+        account: Sequence[str] = (),
+    ) -> str:
+        """根据生成参数和账号计算缓存键
+
+        缓存文件默认位于共享的临时目录，键中包含账号标识，
+        一个账号生成的图片不会返回给其他账号。
+
+        Args:
+            account: 账号标识（cookie指纹或账号池的指纹列表）
+
+        Returns:
+            缓存键
+        """
+        raw = json.dumps(
+            [list(account), model, prompt, negative_prompt, int(width), int(height), float(sample_strength), seed],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            图片URL列表，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT urls, created_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE results SET last_used = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, urls: List[str]) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            urls: 图片URL列表
+        """
+        if not urls:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, urls, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(urls), now, now),
+            )
+            self._conn.execute('DELETE FROM results WHERE created_at < ?', (now - self.ttl,))
+            self._conn.execute(
+                'DELETE FROM results WHERE key NOT IN '
+                '(SELECT key FROM results ORDER BY last_used DESC LIMIT ?)',
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计
+
+        Returns:
+            包含 hits、misses、hit_rate、size 的字典
+        """
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': size,
+        }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+_default_cache: Optional[ResultCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    """获取进程内共享的结果缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
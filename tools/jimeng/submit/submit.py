@@ -0,0 +1,78 @@
+from collections.abc import Generator
+from typing import Any
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from tools.jimeng.jimeng_generator import (
+    parse_prompts,
+    refresh_pool_points,
+    run_sync,
+    submit_generations,
+)
+from tools.jimeng.cookie_pool import get_cookie_pool, parse_cookies
+from tools.jimeng.job_journal import get_job_journal
+
+class JimengSubmitTool(Tool):
+    """即梦生成任务提交工具
+
+    只提交草稿并立即返回记录ID，不等待生成完成，结果由 jimeng_fetch 查询。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # 获取参数
+        cookie = tool_parameters.get('cookie', '')
+        prompt = tool_parameters.get('prompt', '')
+        prompts = parse_prompts(tool_parameters.get('prompts'))
+        count = int(tool_parameters.get('count') or 1)
+        model = tool_parameters.get('model', 'jimeng-2.1')
+        negative_prompt = tool_parameters.get('negative_prompt', '')
+        width = int(tool_parameters.get('width', 1024))
+        height = int(tool_parameters.get('height', 1024))
+        sample_strength = float(tool_parameters.get('sample_strength', 0.75))
+        seed = tool_parameters.get('seed')
+        seed = int(seed) if seed not in (None, '') else None
+
+        try:
+            if not prompts and not prompt:
+                raise Exception('请提供提示词或批量提示词')
+
+            # 多个cookie（每行一个）时使用账号池
+            cookies = parse_cookies(cookie)
+            if len(cookies) > 1:
+                cookie = get_cookie_pool(cookies)
+                if all(account.points is None for account in cookie.accounts):
+                    run_sync(refresh_pool_points(cookie))
+
+            results = run_sync(submit_generations(
+                cookie=cookie,
+                prompts=prompts or [prompt],
+                count=count,
+                model=model,
+                negative_prompt=negative_prompt,
+                width=width,
+                height=height,
+                sample_strength=sample_strength,
+                seed=seed,
+                journal=get_job_journal()
+            ))
+
+            yield ToolInvokeMessage(
+                type="json",
+                message={
+                    "json_object": {
+                        "history_ids": [r['history_id'] for r in results if 'history_id' in r],
+                        "submissions": results
+                    }
+                }
+            )
+
+        except Exception as e:
+            yield ToolInvokeMessage(
+                type="text",
+                message={
+                    "text": f"提交失败：{str(e)}"
+                }
+            )
+            raise e
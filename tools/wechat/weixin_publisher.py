@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 import os
 from dotenv import load_dotenv
+from tools.common.html_rewriter import image_sources, rewrite_images
+from tools.common.multipart import MultipartEncoder, SpooledImage, download_image, open_image
 
 # 加载 .env 文件
 load_dotenv()
@@ -52,37 +54,42 @@ class WeixinPublisher:
             raise ValueError(f"调用token服务失败: {str(e)}")
 
     def process_content_images(self, content: str) -> str:
-        """处理文章内容中的图片"""
-        import re
-        img_regex = r'<img[^>]+src="([^"]+)"[^>]*>'
-        processed_content = content
-        
-        for match in re.finditer(img_regex, content):
-            original_url = match.group(1)
+        """处理文章内容中的图片，只替换 img 的 src，其余内容保持不变"""
+        uploaded = {}
+        for original_url in dict.fromkeys(image_sources(content)):
             try:
-                new_url = self.upload_content_image(original_url)
-                processed_content = processed_content.replace(original_url, new_url)
+                uploaded[original_url] = self.upload_content_image(original_url)
             except Exception as e:
                 print(f"处理文章内图片失败: {str(e)}")
                 continue
                 
-        return processed_content
+        return rewrite_images(content, uploaded.get)
+
+    def _read_image(self, image_source: str) -> SpooledImage:
+        """读取图片数据，支持URL和本地文件路径（如即梦工具转码后的本地图片）
+        
+        网络图片流式下载，较大的图片落到临时文件，不整张放在内存中。
+        """
+        if not image_source.startswith('http') and os.path.isfile(image_source):
+            return open_image(image_source, 'image/jpeg')
+        return download_image(image_source)
+
+    def _post_image(self, url: str, image_source: str) -> Dict[str, Any]:
+        """以流式 multipart 请求体上传图片"""
+        with self._read_image(image_source) as image:
+            body = MultipartEncoder(files={
+                'media': ('image.jpg', image.file, 'image/jpeg')
+            })
+            response = requests.post(url, data=body, headers={'Content-Type': body.content_type})
+        return response.json()
 
     def upload_content_image(self, image_url: str) -> str:
         """上传文章内容图片"""
         token = self.ensure_access_token()
         url = f"https://api.weixin.qq.com/cgi-bin/media/uploadimg?access_token={token}"
         
-        # 下载图片
-        img_response = requests.get(image_url)
-        img_data = img_response.content
-        
-        # 上传图片
-        files = {
-            'media': ('image.jpg', img_data, 'image/jpeg')
-        }
-        response = requests.post(url, files=files)
-        result = response.json()
+        # 下载并上传图片
+        result = self._post_image(url, image_url)
         
         if 'url' not in result:
             raise ValueError(f"上传图片失败: {json.dumps(result)}")
@@ -97,16 +104,8 @@ class WeixinPublisher:
         token = self.ensure_access_token()
         url = f"https://api.weixin.qq.com/cgi-bin/material/add_material?access_token={token}&type=image"
         
-        # 下载图片
-        img_response = requests.get(image_url)
-        img_data = img_response.content
-        
-        # 上传图片
-        files = {
-            'media': ('image.jpg', img_data, 'image/jpeg')
-        }
-        response = requests.post(url, files=files)
-        result = response.json()
+        # 下载并上传图片
+        result = self._post_image(url, image_url)
         
         if 'media_id' not in result:
             raise ValueError(f"上传图片失败: {json.dumps(result)}")